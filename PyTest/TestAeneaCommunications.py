@@ -0,0 +1,279 @@
+#
+# TestAeneaCommunications.py
+#   tests of the connection handling of aenea.communications (circuit breaker,
+#   replay queue, server pool), against StandInServers (aenea.stand_in_server)
+#   on localhost:
+#
+#   python PyTest/TestAeneaCommunications.py
+#
+#   needs jsonrpclib and pyparsing, as aenea itself
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+thisDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.normpath(os.path.join(thisDir, '..'))
+if rootDir not in sys.path:
+    sys.path.insert(0, rootDir)
+
+# outside NatLink aenea keeps its state (server_state.json) in a project root
+# relative to the current directory, so work in a temporary one:
+workDir = tempfile.mkdtemp()
+startDir = os.getcwd()
+os.chdir(workDir)
+
+import aenea.config
+import aenea.communications
+import aenea.configuration
+import aenea.metrics
+from aenea.stand_in_server import StandInServer
+
+# short timeouts, and no health checks unless a test wants them:
+aenea.config.CONNECT_TIMEOUT = 0.05
+aenea.config.CONNECT_RETRY_COOLDOWN = 0.05
+aenea.config.COMMAND_TIMEOUT = 0.3
+aenea.config.HEALTH_CHECK_INTERVAL = 3600
+
+
+def waitFor(condition, timeout=5):
+    """poll condition until it is true, False after timeout seconds"""
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+def freeAddress():
+    """an address on which no server listens (that of a stopped server)"""
+    server = StandInServer()
+    address = server.address
+    server.stop()
+    return address
+
+def texts(server):
+    return [call.params['text'] for call in list(server.calls)
+            if call.method == 'write_text']
+
+def counter(name):
+    return aenea.metrics.snapshot()['counters'].get(name, 0)
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+        self.proxies = []
+        self.saved = (aenea.config.REPLAY_QUEUE_SIZE, aenea.config.REPLAY_MAX_AGE,
+                      aenea.config.REPLAY_DROP_POLICY, aenea.config.HEALTH_CHECK_INTERVAL)
+
+    def tearDown(self):
+        (aenea.config.REPLAY_QUEUE_SIZE, aenea.config.REPLAY_MAX_AGE,
+         aenea.config.REPLAY_DROP_POLICY, aenea.config.HEALTH_CHECK_INTERVAL) = self.saved
+        for proxy in self.proxies:
+            proxy.close()
+        for server in self.servers:
+            server.stop()
+
+    def startServer(self, address=('127.0.0.1', 0), **settings):
+        server = StandInServer(address[0], address[1], **settings).start()
+        self.servers.append(server)
+        return server
+
+    def proxy(self, address, servers_config=None):
+        proxy = aenea.communications.Proxy(address, servers_config)
+        self.proxies.append(proxy)
+        # wait for the first probe (done, or failed), so it does not race the test:
+        backend = proxy._backend
+        self.assertTrue(waitFor(lambda: backend._prober is None or
+                                not backend.last_connect_good))
+        return proxy
+
+
+class TestBreaker(ServerTestCase):
+    def testFirstCommandSent(self):
+        # the circuit starts closed, the first command does not wait for a probe:
+        server = self.startServer()
+        proxy = aenea.communications.Proxy(server.address, None)
+        self.proxies.append(proxy)
+        self.assertTrue(proxy.last_connect_good)
+        proxy.write_text(text='first')
+        self.assertTrue(waitFor(lambda: texts(server) == ['first']))
+
+    def testUnreachableAtStart(self):
+        proxy = self.proxy(freeAddress())
+        self.assertFalse(proxy.last_connect_good)
+
+    def testOpenProbeClose(self):
+        server = self.startServer(failure_mode='hang', hang_time=1)
+        proxy = self.proxy(server.address)
+        proxy.write_text(text='sent')
+        self.assertEqual(['sent'], texts(server))
+
+        # a timeout opens the circuit, the timed out command is not replayed:
+        opened = counter('rpc.circuit_opened')
+        server.fail_next()
+        proxy.write_text(text='timed out')
+        self.assertFalse(proxy.last_connect_good)
+        self.assertEqual(opened + 1, counter('rpc.circuit_opened'))
+
+        # the server accepts connections again: the prober sends the queue
+        # and closes the circuit:
+        proxy.write_text(text='queued')
+        self.assertTrue(waitFor(lambda: proxy.last_connect_good))
+        self.assertEqual(['sent', 'timed out', 'queued'], texts(server))
+        proxy.write_text(text='direct')
+        self.assertEqual(['sent', 'timed out', 'queued', 'direct'], texts(server))
+
+    def testQueriesNotQueued(self):
+        proxy = self.proxy(freeAddress())
+        self.assertEqual(None, proxy.server_info())
+        self.assertEqual(0, len(proxy._backend._replay_queue))
+
+
+class TestReplayQueue(ServerTestCase):
+    def fillQueue(self, count):
+        """send count texts to a server that is down, then start it; return it"""
+        address = freeAddress()
+        proxy = self.proxy(address)
+        for i in range(count):
+            proxy.write_text(text=str(i))
+        server = self.startServer(address)
+        self.assertTrue(waitFor(lambda: proxy.last_connect_good))
+        return server
+
+    def testInOrder(self):
+        server = self.fillQueue(5)
+        self.assertEqual(['0', '1', '2', '3', '4'], texts(server))
+
+    def testDropOldest(self):
+        aenea.config.REPLAY_QUEUE_SIZE = 3
+        aenea.config.REPLAY_DROP_POLICY = 'oldest'
+        server = self.fillQueue(5)
+        self.assertEqual(['2', '3', '4'], texts(server))
+
+    def testDropNewest(self):
+        aenea.config.REPLAY_QUEUE_SIZE = 3
+        aenea.config.REPLAY_DROP_POLICY = 'newest'
+        server = self.fillQueue(5)
+        self.assertEqual(['0', '1', '2'], texts(server))
+
+    def testExpired(self):
+        aenea.config.REPLAY_MAX_AGE = 0.5
+        address = freeAddress()
+        proxy = self.proxy(address)
+        proxy.write_text(text='expired')
+        time.sleep(0.6)
+        proxy.write_text(text='recent')
+        server = self.startServer(address)
+        self.assertTrue(waitFor(lambda: proxy.last_connect_good))
+        self.assertEqual(['recent'], texts(server))
+
+
+class TestPool(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        # the servers of the pool, as in grammar_config/aenea.json:
+        self.configPath = os.path.join(workDir, self.id())
+
+    def writeServers(self, *addresses):
+        servers = dict(('server%s' % i, {'host': host, 'port': port})
+                       for (i, (host, port)) in enumerate(addresses))
+        with open(self.configPath + '.json', 'w') as fd:
+            json.dump({'servers': servers}, fd)
+
+    def poolProxy(self, address):
+        return self.proxy(address, aenea.configuration.ConfigWatcher(self.configPath))
+
+    def reachable(self, proxy, address):
+        """None if address is not in the pool of proxy"""
+        for (server, good, active) in proxy.servers():
+            if server == address:
+                return good
+
+    def testSwitch(self):
+        first, second = self.startServer(), self.startServer()
+        self.writeServers(first.address, second.address)
+        proxy = self.poolProxy(first.address)
+        proxy.write_text(text='a')
+        proxy.switch(second.address)
+        proxy.write_text(text='b')
+        proxy.switch(first.address)
+        proxy.write_text(text='c')
+        self.assertEqual(['a', 'c'], texts(first))
+        self.assertEqual(['b'], texts(second))
+        self.assertEqual(sorted([(first.address, True, True), (second.address, True, False)]),
+                         proxy.servers())
+
+    def testSwitchToFailing(self):
+        good, failingAddress = self.startServer(), freeAddress()
+        self.writeServers(good.address, failingAddress)
+        proxy = self.poolProxy(good.address)
+        self.assertTrue(waitFor(lambda: self.reachable(proxy, failingAddress) is False))
+
+        # commands for a server that is down wait, until switched away from:
+        proxy.switch(failingAddress)
+        proxy.write_text(text='dropped')
+        proxy.switch(good.address)
+        proxy.write_text(text='sent')
+        self.assertEqual(['sent'], texts(good))
+
+        # back up, the server is probed and closes its circuit, without
+        # getting the command of before the switch:
+        failing = self.startServer(failingAddress)
+        self.assertTrue(waitFor(lambda: self.reachable(proxy, failingAddress)))
+        self.assertEqual([], texts(failing))
+
+    def testRemovedFromConfig(self):
+        first, second = self.startServer(), self.startServer()
+        self.writeServers(first.address, second.address)
+        proxy = self.poolProxy(first.address)
+        secondBackend = proxy._backends[second.address]
+
+        self.writeServers(first.address)
+        self.assertEqual([first.address], [server for (server, _, _) in proxy.servers()])
+        self.assertTrue(secondBackend._closed)
+
+        # the active server stays in the pool until switched away from:
+        self.writeServers(second.address)
+        self.assertEqual(sorted([first.address, second.address]),
+                         [server for (server, _, _) in proxy.servers()])
+        proxy.switch(second.address)
+        self.assertEqual([second.address], [server for (server, _, _) in proxy.servers()])
+
+    def testHealthCheck(self):
+        aenea.config.HEALTH_CHECK_INTERVAL = 0.1
+        good = self.startServer()
+        flaky = self.startServer(failure_mode='hang', hang_time=1)
+        self.writeServers(good.address, flaky.address)
+        proxy = self.poolProxy(good.address)
+        self.assertTrue(waitFor(lambda: 'server_info' in flaky.methods()))
+
+        # a health check that times out opens the circuit of the server, its
+        # prober closes it again when the server accepts connections:
+        failed, opened = counter('pool.health_failed'), counter('rpc.circuit_opened')
+        flaky.fail_next()
+        self.assertTrue(waitFor(lambda: counter('pool.health_failed') == failed + 1))
+        self.assertEqual(opened + 1, counter('rpc.circuit_opened'))
+        # meanwhile, the active server is not kept waiting:
+        proxy.write_text(text='during')
+        self.assertEqual(['during'], texts(good))
+        self.assertTrue(waitFor(lambda: self.reachable(proxy, flaky.address)))
+
+        # and health checked again:
+        checks = len(flaky.methods())
+        self.assertTrue(waitFor(lambda: len(flaky.methods()) > checks))
+        self.assertEqual(failed + 1, counter('pool.health_failed'))
+
+
+def tearDownModule():
+    os.chdir(startDir)
+    shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#
+# TestExtendedSendDragonKeys.py
+#   tests of the parsing of the extended SendDragonKeys syntax and of the chord
+#   cache (ExtendedSendDragonKeys), with the keyboard layout parts (single and
+#   how_type_character) replaced, so they also run outside Windows:
+#
+#   python PyTest/TestExtendedSendDragonKeys.py
+#
+import os
+import sys
+import unittest
+from StringIO import StringIO
+
+thisDir = os.path.dirname(os.path.abspath(__file__))
+coreDir = os.path.normpath(os.path.join(thisDir, '..', 'core'))
+if coreDir not in sys.path:
+    sys.path.insert(0, coreDir)
+
+import ExtendedSendDragonKeys as keys
+
+
+knownKeys = ['a', 'b', 'shift', 'ctrl', 'alt', 'left'] + \
+            ['numkey%s' % i for i in range(10)]
+
+def fakeSingle(key, releasing):
+    """one (key, releasing) event per known key, as single does with a key name"""
+    if key not in knownKeys:
+        raise KeyError(key)
+    return [(key, releasing)]
+
+def fakeHowTypeCharacter(char):
+    """no character can be typed as a key, as on an empty keyboard layout"""
+    raise ValueError(char)
+
+
+class TestParseIntoChords(unittest.TestCase):
+    def testCharacters(self):
+        self.assertEqual([[None, 'a', None, 'a'], [None, ' ', None, ' ']],
+                         keys.parse_into_chords('a '))
+
+    def testChord(self):
+        self.assertEqual([['shift', 'left', '10', '{shift+left_10}'],
+                          ['ctrl+alt', 'b', 'hold', '{ctrl+alt+b hold}']],
+                         keys.parse_into_chords('{shift+left_10}{ctrl+alt+b hold}'))
+
+    def testBrace(self):
+        self.assertEqual([['', '{', None, '{{}'], [None, 'a', None, 'a']],
+                         keys.parse_into_chords('{{}a'))
+
+    def testUnmatchedBrace(self):
+        # a brace that does not start a chord is just a character:
+        self.assertEqual([[None, '{', None, '{'], [None, 'a', None, 'a']],
+                         keys.parse_into_chords('{a'))
+
+
+class TestChordCache(unittest.TestCase):
+    def setUp(self):
+        self.saved = (keys.single, keys.how_type_character, keys.chord_cache_size,
+                      sys.stdout)
+        keys.single = fakeSingle
+        keys.how_type_character = fakeHowTypeCharacter
+        keys.clear_chord_cache()
+        sys.stdout = self.output = StringIO()
+
+    def tearDown(self):
+        (keys.single, keys.how_type_character, keys.chord_cache_size,
+         sys.stdout) = self.saved
+        keys.clear_chord_cache()
+
+    def chord(self, text):
+        [chord] = keys.parse_into_chords(text)
+        return chord
+
+    def testHit(self):
+        events = keys.cached_chord_to_events(self.chord('{shift+a}'), 'layout')
+        self.assertEqual((('shift', False), ('a', False), ('a', True), ('shift', True)),
+                         events)
+        keys.single = None   # a hit does not convert again
+        self.assertEqual(events, keys.cached_chord_to_events(self.chord('{shift+a}'),
+                                                             'layout'))
+
+    def testContext(self):
+        keys.cached_chord_to_events(self.chord('a'), 'layout')
+        keys.cached_chord_to_events(self.chord('a'), 'other layout')
+        self.assertEqual(2, len(keys.chord_cache))
+
+    def testLeastRecentlyUsedDropped(self):
+        keys.chord_cache_size = 2
+        for text in ['a', 'b', 'a', '{shift}']:
+            keys.cached_chord_to_events(self.chord(text), 'layout')
+        self.assertEqual([('a', 'layout'), ('{shift}', 'layout')],
+                         list(keys.chord_cache))
+
+    def testErrorNotCached(self):
+        self.assertRaises(KeyError, keys.cached_chord_to_events,
+                          self.chord('{nosuchkey}'), 'layout')
+        self.assertEqual(0, len(keys.chord_cache))
+
+    def testWarningsAtEachUse(self):
+        # a character without a key is typed by numpad entry, without the modifiers:
+        for i in range(2):
+            events = keys.cached_chord_to_events(self.chord('{ctrl+\xe9}'), 'layout')
+            self.assertEqual(('alt', False), events[0])
+        self.assertEqual(1, len(keys.chord_cache))
+        warning = "Warning: unable to use modifiers with character: \xe9\n"
+        self.assertEqual(warning * 2, self.output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#
+# TestGrammarBaseLists.py
+#   tests of GrammarBase.setList (natlinkutils), on a fake gramObj that records
+#   the emptyList and appendList calls, so no grammar has to be loaded in
+#   NaturallySpeaking (and they also run outside Windows):
+#
+#   python PyTest/TestGrammarBaseLists.py
+#
+import os
+import sys
+import types
+import unittest
+
+thisDir = os.path.dirname(os.path.abspath(__file__))
+coreDir = os.path.normpath(os.path.join(thisDir, '..', 'core'))
+if coreDir not in sys.path:
+    sys.path.insert(0, coreDir)
+
+try:
+    import natlink
+except ImportError:
+    # outside NaturallySpeaking: natlinkutils (and natlinkmain) only need the module
+    sys.modules['natlink'] = types.ModuleType('natlink')
+
+import gramparser
+import natlinkutils
+
+
+class FakeGramObj(object):
+    """records the list calls that would go to natlink"""
+    def __init__(self):
+        self.calls = []
+
+    def emptyList(self, listName):
+        self.calls.append(('emptyList', listName))
+
+    def appendList(self, listName, word):
+        self.calls.append(('appendList', listName, word))
+
+    def unload(self):
+        pass
+
+
+def fakeGrammar(listNames):
+    """return a GrammarBase with listNames as (empty) lists and a FakeGramObj,
+    as after loading a grammar that defines these lists
+    """
+    grammar = natlinkutils.GrammarBase.__new__(natlinkutils.GrammarBase)
+    grammar.gramObj = FakeGramObj()
+    grammar.scanObj = None
+    grammar.validLists = list(listNames)
+    grammar.listShadow = dict([(listName, []) for listName in listNames])
+    return grammar
+
+
+class TestSetList(unittest.TestCase):
+    def setUp(self):
+        self.grammar = fakeGrammar(['colors'])
+        self.grammar.setList('colors', ['red', 'green'])
+        self.calls = self.grammar.gramObj.calls
+        del self.calls[:]
+
+    def testFirst(self):
+        grammar = fakeGrammar(['colors'])
+        grammar.setList('colors', ['red', 'green'])
+        self.assertEqual([('appendList', 'colors', 'red'),
+                          ('appendList', 'colors', 'green')], grammar.gramObj.calls)
+
+    def testUnchanged(self):
+        self.grammar.setList('colors', ['green', 'red'])
+        self.grammar.setList(u'colors', [u'red', u'green', u'red'])
+        self.assertEqual([], self.calls)
+
+    def testAddOnly(self):
+        self.grammar.setList('colors', ['red', 'green', 'blue', 'white'])
+        self.assertEqual([('appendList', 'colors', 'blue'),
+                          ('appendList', 'colors', 'white')], self.calls)
+        self.assertEqual(['red', 'green', 'blue', 'white'], self.grammar.listShadow['colors'])
+
+    def testRemove(self):
+        # natlink cannot remove a single word, so the list is sent again:
+        self.grammar.setList('colors', ['green', 'blue'])
+        self.assertEqual([('emptyList', 'colors'),
+                          ('appendList', 'colors', 'green'),
+                          ('appendList', 'colors', 'blue')], self.calls)
+        self.assertEqual(['green', 'blue'], self.grammar.listShadow['colors'])
+
+    def testUnknownContents(self):
+        del self.grammar.listShadow['colors']
+        self.grammar.setList('colors', ['red', 'green'])
+        self.assertEqual([('emptyList', 'colors'),
+                          ('appendList', 'colors', 'red'),
+                          ('appendList', 'colors', 'green')], self.calls)
+
+    def testUndefinedList(self):
+        self.assertRaises(gramparser.GrammarError, self.grammar.setList, 'sizes', ['big'])
+        self.assertEqual([], self.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
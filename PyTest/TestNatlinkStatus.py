@@ -0,0 +1,134 @@
+#
+# TestNatlinkStatus.py
+#   tests of the ini file parts of natlinkstatus (nssystem.ini, nsapps.ini,
+#   natlinkstatus.ini and the status snapshot), on the fixture files in
+#   PyTest/fixtures, so they also run outside Windows:
+#
+#   python PyTest/TestNatlinkStatus.py
+#
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+
+thisDir = os.path.dirname(os.path.abspath(__file__))
+fixturesDir = os.path.join(thisDir, 'fixtures')
+coreDir = os.path.normpath(os.path.join(thisDir, '..', 'core'))
+if coreDir not in sys.path:
+    sys.path.insert(0, coreDir)
+
+import natlinkcorefunctions
+import natlinkstatus
+
+
+class FixtureStatus(natlinkstatus.NatlinkStatus):
+    """NatlinkStatus on the ini files of a directory, without the registry
+
+    iniDir holds nssystem.ini and nsapps.ini, and natlinkstatus.ini if given
+    """
+    def __init__(self, iniDir):
+        self.skipSpecialWarning = 1
+        self.userregnl = natlinkcorefunctions.InifileSection(
+            section='usersettings', filename=os.path.join(iniDir, 'natlinkstatus.ini'))
+        self.CoreDirectory = coreDir
+        self.DNSInstallDir = iniDir
+        self.DNSIniDir = iniDir
+
+    def getNatlinkStatusDict(self):
+        return {'DNSIniDir': self.DNSIniDir,
+                'UserDirectory': self.getUserDirectory(),
+                'natlinkIsEnabled': self.NatlinkIsEnabled()}
+
+
+class TestProfileVal(unittest.TestCase):
+    def testValues(self):
+        nssystemini = os.path.join(fixturesDir, 'dnsini', 'nssystem.ini')
+        get = natlinkstatus.getProfileVal
+        self.assertEqual('15.00.000.076', get('Product Attributes', 'Version', '', nssystemini))
+        self.assertEqual('Python Macro System', get('Global Clients', '.Natlink', '', nssystemini))
+        self.assertEqual('1', get('Options', 'Use Mouse', '', nssystemini))
+        self.assertEqual('default', get('Options', 'Missing', 'default', nssystemini))
+        self.assertEqual('default', get('Missing', 'Version', 'default', nssystemini))
+
+    def testInvalidFiles(self):
+        get = natlinkstatus.getProfileVal
+        self.assertEqual('', get('Product Attributes', 'Version', '',
+                                 os.path.join(fixturesDir, 'noheader.ini')))
+        self.assertEqual('', get('Product Attributes', 'Version', '',
+                                 os.path.join(fixturesDir, 'broken.ini')))
+        self.assertEqual('', get('Product Attributes', 'Version', '',
+                                 os.path.join(fixturesDir, 'missing.ini')))
+
+
+class TestNatlinkIsEnabled(unittest.TestCase):
+    def testEnabled(self):
+        status = FixtureStatus(os.path.join(fixturesDir, 'dnsini'))
+        self.assertEqual(1, status.NatlinkIsEnabled())
+
+    def testDisabled(self):
+        status = FixtureStatus(os.path.join(fixturesDir, 'dnsini_disabled'))
+        self.assertEqual(0, status.NatlinkIsEnabled())
+
+
+class TestStatusSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.iniDir = os.path.join(self.tempDir, 'dnsini')
+        shutil.copytree(os.path.join(fixturesDir, 'dnsini'), self.iniDir)
+        for name in ('user1', 'userdir2'):
+            os.mkdir(os.path.join(self.tempDir, name))
+        self.writeUserDirectory('user1')
+        FixtureStatus.clearCache()
+        natlinkstatus.clearStatusSnapshot()
+        self.status = FixtureStatus(self.iniDir)
+
+    def tearDown(self):
+        natlinkstatus.clearStatusSnapshot()
+        FixtureStatus.clearCache()
+        shutil.rmtree(self.tempDir)
+
+    def writeUserDirectory(self, name):
+        path = os.path.join(self.iniDir, 'natlinkstatus.ini')
+        with open(path, 'w') as f:
+            f.write('[usersettings]\nUserDirectory = %s\n'% os.path.join(self.tempDir, name))
+        # make the change visible to the (mtime, size) checks:
+        t = time.time() + 10
+        os.utime(path, (t, t))
+
+    def append(self, filename, text):
+        path = os.path.join(self.iniDir, filename)
+        with open(path, 'a') as f:
+            f.write(text)
+
+    def testUnchanged(self):
+        snapshot = natlinkstatus.getStatusSnapshot(self.status)
+        self.assertEqual(1, snapshot.natlinkIsEnabled)
+        self.assertTrue(snapshot is natlinkstatus.getStatusSnapshot(self.status))
+        self.assertRaises(TypeError, setattr, snapshot, 'UserDirectory', '')
+
+    def testDragonIniChanged(self):
+        snapshot = natlinkstatus.getStatusSnapshot(self.status)
+        self.append('nsapps.ini', '[Other]\r\nkey=value\r\n')
+        newSnapshot = natlinkstatus.getStatusSnapshot(self.status)
+        self.assertFalse(newSnapshot is snapshot)
+        # natlinkstatus.ini did not change, so its directories are kept:
+        self.assertEqual(snapshot.UserDirectory, FixtureStatus.UserDirectory)
+
+    def testNatlinkstatusIniChanged(self):
+        snapshot = natlinkstatus.getStatusSnapshot(self.status)
+        self.assertTrue(snapshot.UserDirectory.endswith('user1'))
+        self.writeUserDirectory('userdir2')
+        snapshot = natlinkstatus.getStatusSnapshot(self.status)
+        self.assertTrue(snapshot.UserDirectory.endswith('userdir2'))
+
+    def testRefreshKeepsCache(self):
+        natlinkstatus.getStatusSnapshot(self.status)
+        FixtureStatus.UserDirectory = 'cached'
+        snapshot = natlinkstatus.refreshStatusSnapshot(self.status)
+        self.assertEqual('cached', snapshot.UserDirectory)
+
+
+if __name__ == "__main__":
+    unittest.main()
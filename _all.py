@@ -1,7 +1,10 @@
 # _all.py: main rule for DWK's grammar
 
 from natlink import setMicState
+import natlinkmain
 from aenea import *
+import aenea.recording
+import aenea.tracing
 
 import keyboard
 import words
@@ -30,13 +33,28 @@ class RepeatRule(CompoundRule):
         "n": 1,  # Default repeat count.
     }
 
+    def process_recognition(self, node):
+        # Trace the recognition from here, so the value() calls of the
+        # sequence are included (see aenea.tracing).
+        record = aenea.recording.begin(self.name, node.words())
+        try:
+            with aenea.tracing.recognition(self.name, node.words()):
+                CompoundRule.process_recognition(self, node)
+        finally:
+            aenea.recording.end(record)
+            # Show what the recognition printed now, not at the next
+            # utterance (see natlinkmain.OutputBuffer).
+            natlinkmain.flushOutput()
+
     def _process_recognition(self, node, extras):  # @UnusedVariable
         sequence = extras["sequence"]  # A sequence of actions.
         count = extras["n"]  # An integer repeat count.
-        for i in range(count):  # @UnusedVariable
-            for action in sequence:
-                action.execute()
-            release.execute()
+        aenea.recording.add_extras(extras)
+        with aenea.tracing.span("process_recognition"):
+            for i in range(count):  # @UnusedVariable
+                for action in sequence:
+                    action.execute()
+                release.execute()
 
 grammar = Grammar("root rule")
 grammar.add_rule(RepeatRule())  # Add the top-level rule.
@@ -1,11 +1,182 @@
 # A grammar file that sets up logging in Dragonfly.
 # Obtained from "https://groups.google.com/forum/m/#!topic/dragonflyspeech/UQncfE-Jv5I"
+#
+# The handlers of log.setup_log() are moved behind a queue: recognition callbacks
+# only put the log records (with their message and traceback already merged) in
+# the queue, a background thread formats and writes them (to stdout and a size
+# rotated log file, that is opened when the first record is written to it).  Each logger may put at most
+# rate_limit_burst records in the queue at once, refilled with rate_limit_per_second
+# records per second; records over that limit, or that do not fit in the queue,
+# are dropped and counted.
 
 import logging
+import logging.handlers
+import os
+import Queue
+import threading
+import time
 from dragonfly import log, CompoundRule, Grammar
 
 
-log.setup_log()
+queue_size = 1000
+rate_limit_per_second = 20.0
+rate_limit_burst = 50
+log_file_max_bytes = 1000000
+log_file_backup_count = 3
+
+
+class QueueLogHandler(logging.Handler):
+    """Puts each record in the queue, with the handlers that should handle it
+       (in the background thread).  Replaces a handler of log.setup_log()."""
+
+    def __init__(self, log_queue, targets, stats):
+        logging.Handler.__init__(self)
+        self.log_queue = log_queue
+        self.targets = targets
+        self.stats = stats
+
+    def prepare(self, record):
+        """Merges the arguments into the message and renders the traceback, so
+           the queued record does not depend on objects that may change (or be
+           gone) before the background thread writes it."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if not self.stats.allow(record.name):
+            return
+        try:
+            self.log_queue.put_nowait((self.targets, self.prepare(record)))
+        except Queue.Full:
+            self.stats.dropped_full += 1
+        except Exception:
+            self.handleError(record)
+
+
+class LogStats(object):
+    """Per logger rate limiting (token bucket) and counts of dropped records."""
+
+    def __init__(self, per_second, burst):
+        self.per_second = per_second
+        self.burst = burst
+        self.buckets = {}
+        self.dropped_full = 0
+        self.dropped_rate = 0
+        self.lock = threading.Lock()
+
+    def allow(self, name):
+        now = time.time()
+        with self.lock:
+            tokens, stamp = self.buckets.get(name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.per_second)
+            if tokens < 1:
+                self.buckets[name] = (tokens, now)
+                self.dropped_rate += 1
+                return False
+            self.buckets[name] = (tokens - 1, now)
+            return True
+
+
+class LogListener(threading.Thread):
+    """Background thread that lets the target handlers handle the queued records."""
+
+    def __init__(self, log_queue):
+        threading.Thread.__init__(self, name="log listener")
+        self.daemon = True
+        self.log_queue = log_queue
+
+    def run(self):
+        while True:
+            item = self.log_queue.get()
+            if item is None:
+                break
+            targets, record = item
+            for target in targets:
+                try:
+                    target.handle(record)
+                except Exception:
+                    pass
+
+    def stop(self):
+        self.log_queue.put(None)
+        self.join(5)
+
+
+def _log_file_path():
+    """Returns the dragonfly.txt in the user's documents folder, where
+       log.setup_log() writes its log file."""
+    try:
+        from win32com.shell import shell, shellcon
+        folder = shell.SHGetFolderPath(0, shellcon.CSIDL_PERSONAL, 0, 0)
+    except ImportError:
+        folder = os.path.expanduser("~")
+    return os.path.join(folder, "dragonfly.txt")
+
+
+def _rotating_file_handler():
+    """Returns a size rotated handler with the levels of the dragonfly file log.
+       The file is only opened when the first record is written to it."""
+    handler = logging.handlers.RotatingFileHandler(_log_file_path(),
+                                                   maxBytes=log_file_max_bytes,
+                                                   backupCount=log_file_backup_count,
+                                                   delay=True)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s (%(levelname)s):"
+                                           " %(message)s"))
+    for name, (stdout_level, file_level) in log.default_levels.items():
+        handler.addFilter(log.NameLevelFilter(name, file_level))
+    return handler
+
+
+_exception_formatter = logging.Formatter()
+log_queue = Queue.Queue(queue_size)
+log_stats = LogStats(rate_limit_per_second, rate_limit_burst)
+listener = None
+file_handler = None
+queue_handlers = {}
+
+
+def setup_async_log():
+    """Calls log.setup_log() for stdout and puts its handlers, and a rotating
+       file handler in place of its file log, behind the queue."""
+    global listener, file_handler
+    loggers = dict((name, logging.getLogger(name)) for name in log.default_levels)
+    before = dict((name, list(logger.handlers)) for name, logger in loggers.items())
+    log.setup_log(use_file=False)
+    file_handler = _rotating_file_handler()
+    for name, logger in loggers.items():
+        logger.setLevel(min(log.default_levels[name]))
+        handlers = [h for h in logger.handlers if h not in before[name]]
+        for handler in handlers:
+            logger.removeHandler(handler)
+        queue_handler = QueueLogHandler(log_queue, handlers + [file_handler], log_stats)
+        logger.addHandler(queue_handler)
+        queue_handlers[name] = (queue_handler, handlers)
+    listener = LogListener(log_queue)
+    listener.start()
+
+
+def stop_async_log():
+    """Writes the queued records and gives the loggers their handlers back."""
+    global listener, file_handler
+    for name, (queue_handler, handlers) in queue_handlers.items():
+        logger = logging.getLogger(name)
+        logger.removeHandler(queue_handler)
+        for handler in handlers:
+            logger.addHandler(handler)
+    queue_handlers.clear()
+    if listener:
+        listener.stop()
+        listener = None
+    if file_handler:
+        file_handler.close()
+        file_handler = None
+
+
+setup_async_log()
 # log.setup_tracing()
 
 
@@ -15,6 +186,8 @@ class LoggingRule(CompoundRule):
     def _process_recognition(self, node, extras):   # Callback when command is spoken.
         print node.words()
         print 'Yes, looging should be enabled.'
+        print 'Log queue: %d of %d records waiting, dropped: %d (queue full), %d (rate limit)' % (
+            log_queue.qsize(), queue_size, log_stats.dropped_full, log_stats.dropped_rate)
 
         testlog = logging.getLogger("dfly.test")
         testlog.debug("Test the dragonfly test log.")
@@ -35,3 +208,4 @@ def unload():
     global grammar
     if grammar: grammar.unload()
     grammar = None
+    stop_async_log()
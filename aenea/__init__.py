@@ -21,9 +21,12 @@ import aenea.config
 import aenea.format
 import aenea.lax
 import aenea.strict
+import aenea.metrics
 import aenea.misc
 import aenea.proxy_actions
 import aenea.proxy_contexts
+import aenea.recording
+import aenea.tracing
 import aenea.vocabulary
 import aenea.wrappers
 
@@ -32,3 +35,6 @@ from aenea.proxy_actions import *
 from aenea.proxy_contexts import *
 from aenea.strict import *
 from aenea.alias import Alias
+
+aenea.metrics.start()
+aenea.recording.start()
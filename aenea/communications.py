@@ -15,13 +15,17 @@
 # Copyright (2014) Alex Roper
 # Alex Roper <alex@aroper.net>
 
+import collections
 import httplib
 import jsonrpclib
 import socket
+import threading
 import time
 
 import aenea.config
 import aenea.configuration
+import aenea.metrics
+import aenea.tracing
 
 _server_config = aenea.configuration.ConfigWatcher(
     'server_state',
@@ -29,12 +33,18 @@ _server_config = aenea.configuration.ConfigWatcher(
      'port': aenea.config.DEFAULT_SERVER_ADDRESS[1]})
 _server_config.write()
 
+# The servers to keep connections to, the same list as 'set proxy server to'
+# in _aenea.py.
+_servers_config = aenea.configuration.ConfigWatcher(
+    ('grammar_config', 'aenea'))
+
 
 def set_server_address(address):
     '''address is (host, port).'''
     _server_config.refresh()
     _server_config['host'], _server_config['port'] = address
     _server_config.write()
+    server.switch(address)
 
 
 class _ImpatientTransport(jsonrpclib.jsonrpc.Transport):
@@ -63,38 +73,311 @@ class _ImpatientTransport(jsonrpclib.jsonrpc.Transport):
                 )
         return self._connection[1]
 
+    def request(self, host, handler, request_body, verbose=0):
+        aenea.metrics.increment('rpc.bytes_sent', len(request_body))
+        return jsonrpclib.jsonrpc.Transport.request(
+            self, host, handler, request_body, verbose)
 
-class Proxy(object):
-    def __init__(self):
-        self._address = None
-        self.last_connect_good = False
+
+# Methods whose result is needed right away. They are not queued while the
+# server cannot be reached (they return None).
+QUERY_METHODS = ('get_context', 'server_info')
+
+
+class _Backend(object):
+    '''The connection to one server, with a circuit breaker: when the server
+       cannot be reached, a background thread probes it with exponential
+       backoff (up to CONNECT_RETRY_COOLDOWN seconds), and commands wait in
+       a bounded replay queue until it is back. Calls from the recognition
+       thread never wait for a connect probe, nor for a replay or health
+       check that is sending (they are queued behind it).
+
+       Each backend has its own transport, so its keep-alive connection and
+       circuit state survive switching to another server and back.'''
+
+    def __init__(self, address):
+        self.address = address
+        # True for the server commands go to (see Proxy.switch).
+        self.active = False
+        # True if the circuit is closed (commands are sent directly). Closed
+        # at the start, so the first commands do not wait for the first
+        # probe; the first failed send or probe opens it.
+        self.last_connect_good = True
         self._last_failed_connect = 0
+        self._last_send = 0
+        # Set when the server is removed from the pool; ends the prober.
+        self._closed = False
         self._transport = _ImpatientTransport(aenea.config.COMMAND_TIMEOUT)
+        self._server = jsonrpclib.Server(
+            'http://%s:%i' % address,
+            transport=self._transport
+            )
+        self._lock = threading.Lock()
+        self._send_lock = threading.RLock()
+        self._replay_queue = collections.deque()
+        self._prober = None
 
-    def _execute_batch(self, batch, use_multiple_actions=False):
-        self._refresh_server()
-        if self._address is None:
-            return
-        if time.time() - self._last_failed_connect > aenea.config.CONNECT_RETRY_COOLDOWN:
-            try:
-                if not self.last_connect_good:
-                    socket.create_connection(self._address, aenea.config.CONNECT_TIMEOUT)
-                self.last_connect_good = True
+    def execute_batch(self, batch, use_multiple_actions):
+        with self._lock:
+            if not self.last_connect_good or self._replay_queue:
+                # Keep the order: queue behind the commands still waiting.
+                self._enqueue(batch, use_multiple_actions)
+                self._start_prober()
+                return
+            if not self._send_lock.acquire(False):
+                # Another thread is sending; the prober sends this after it.
+                aenea.metrics.increment('rpc.send_busy')
+                self._enqueue(batch, use_multiple_actions)
+                self._start_prober()
+                return
+        try:
+            return self._send(batch, use_multiple_actions)
+        except socket.error as e:
+            with self._lock:
+                self._open_circuit(e)
+                if not isinstance(e, socket.timeout):
+                    # Nothing was sent, replay later. After a timeout the
+                    # server may have executed the batch, so it is dropped.
+                    self._enqueue(batch, use_multiple_actions)
+                self._start_prober()
+        finally:
+            self._send_lock.release()
 
+    def _send(self, batch, use_multiple_actions):
+        with self._send_lock:
+            start = self._last_send = time.time()
+            for (command, args, kwargs) in batch:
+                aenea.metrics.increment('rpc.calls.%s' % command)
+            try:
                 if len(batch) == 1:
-                    return (getattr(
-                        self._server,
-                        batch[0][0])(*batch[0][1], **batch[0][2])
-                        )
+                    with aenea.tracing.span('rpc', method=batch[0][0]):
+                        return (getattr(
+                            self._server,
+                            batch[0][0])(*batch[0][1], **batch[0][2])
+                            )
                 elif use_multiple_actions:
-                    self._server.multiple_actions(batch)
+                    aenea.metrics.increment('rpc.calls.multiple_actions')
+                    with aenea.tracing.span('rpc', method='multiple_actions',
+                                            count=len(batch)):
+                        self._server.multiple_actions(batch)
                 else:
                     for (command, args, kwargs) in batch:
-                        getattr(self._server, command)(*args, **kwargs)
-            except socket.error:
-                self._last_failed_connect = time.time()
-                self.last_connect_good = False
-                print 'Socket error connecting to aenea server. To avoid slowing dictation, we won\'t try again for %i seconds.' % aenea.config.CONNECT_RETRY_COOLDOWN
+                        with aenea.tracing.span('rpc', method=command):
+                            getattr(self._server, command)(*args, **kwargs)
+            except socket.error as e:
+                if isinstance(e, socket.timeout):
+                    aenea.metrics.increment('rpc.timeouts')
+                else:
+                    aenea.metrics.increment('rpc.socket_errors')
+                raise
+            finally:
+                aenea.metrics.observe('rpc.batch_seconds', time.time() - start)
+
+    def check_health(self):
+        '''Sends server_info, which also keeps the connection warm. Skipped
+           while the server is busy with commands or being probed, and for
+           the active server if it was sent to in the last
+           HEALTH_CHECK_INTERVAL seconds. Returns False if the server could
+           not be reached.'''
+        if (self.active and time.time() - self._last_send <
+                aenea.config.HEALTH_CHECK_INTERVAL):
+            return True
+        if not self._send_lock.acquire(False):
+            return True
+        try:
+            with self._lock:
+                if not self.last_connect_good or self._closed:
+                    return True
+            try:
+                self._send([('server_info', (), {})], False)
+            except socket.error as e:
+                aenea.metrics.increment('pool.health_failed')
+                with self._lock:
+                    self._open_circuit(e)
+                    self._start_prober()
+                return False
+            except Exception as e:
+                # The server answered, with an error: it is reachable.
+                aenea.metrics.increment('pool.health_errors')
+                return True
+            aenea.metrics.increment('pool.health_ok')
+            return True
+        finally:
+            self._send_lock.release()
+
+    def activate(self):
+        with self._lock:
+            self.active = True
+            if not self.last_connect_good:
+                self._start_prober()
+
+    def deactivate(self):
+        with self._lock:
+            self.active = False
+            # Commands for this server are not sent once it is switched away
+            # from.
+            self._replay_queue.clear()
+
+    def close(self):
+        '''Called when the server is removed from the pool: ends the prober
+           and closes the connection.'''
+        with self._lock:
+            self._closed = True
+            self.active = False
+            self._replay_queue.clear()
+        # Not while a send is in progress (it ends with an error then).
+        if self._send_lock.acquire(False):
+            try:
+                self._transport.close()
+            finally:
+                self._send_lock.release()
+
+    def _open_circuit(self, error):
+        '''Called with self._lock held.'''
+        if self.last_connect_good:
+            aenea.metrics.increment('rpc.circuit_opened')
+            if self.active:
+                print 'Socket error connecting to aenea server (%s). Commands are queued while we reconnect in the background.' % error
+        self.last_connect_good = False
+        self._last_failed_connect = time.time()
+
+    def _enqueue(self, batch, use_multiple_actions):
+        '''Called with self._lock held.'''
+        if len(batch) == 1 and batch[0][0] in QUERY_METHODS:
+            aenea.metrics.increment('rpc.skipped_queries')
+            return
+        if len(self._replay_queue) >= aenea.config.REPLAY_QUEUE_SIZE:
+            aenea.metrics.increment('rpc.dropped')
+            if aenea.config.REPLAY_DROP_POLICY == 'newest':
+                return
+            self._replay_queue.popleft()
+        aenea.metrics.increment('rpc.queued')
+        self._replay_queue.append((time.time(), batch, use_multiple_actions))
+
+    def _start_prober(self):
+        '''Called with self._lock held.'''
+        if self._prober is None:
+            self._prober = threading.Thread(
+                target=self._probe,
+                name='aenea reconnect %s:%i' % self.address
+                )
+            self._prober.daemon = True
+            self._prober.start()
+
+    def _probe(self):
+        '''Probes the server until it accepts a connection and the replay
+           queue is sent.'''
+        delay = 0
+        try:
+            while not self._closed:
+                if delay:
+                    time.sleep(delay)
+                delay = min(max(delay * 2, aenea.config.CONNECT_TIMEOUT),
+                            aenea.config.CONNECT_RETRY_COOLDOWN)
+                aenea.metrics.increment('rpc.connect_probes')
+                try:
+                    socket.create_connection(
+                        self.address, aenea.config.CONNECT_TIMEOUT).close()
+                except socket.error as e:
+                    with self._lock:
+                        self._open_circuit(e)
+                    continue
+                if self._drain():
+                    break
+        finally:
+            with self._lock:
+                if self._prober is threading.current_thread():
+                    self._prober = None
+
+    def _drain(self):
+        '''Sends the replay queue in order, and closes the circuit when it is
+           empty (the prober is done then). Returns False if the server
+           failed again.'''
+        replayed = 0
+        with self._send_lock:
+            while True:
+                with self._lock:
+                    if not self._replay_queue:
+                        if (self.active and not self.last_connect_good and
+                                self._last_failed_connect):
+                            print 'Reconnected to aenea server, sent %i queued commands.' % replayed
+                        self.last_connect_good = True
+                        # Cleared together with closing the circuit, so a
+                        # failure right after starts a new prober.
+                        if self._prober is threading.current_thread():
+                            self._prober = None
+                        return True
+                    entry = stamp, batch, use_multiple_actions = self._replay_queue[0]
+                if time.time() - stamp > aenea.config.REPLAY_MAX_AGE:
+                    aenea.metrics.increment('rpc.dropped')
+                    self._pop_replayed(entry)
+                    continue
+                try:
+                    self._send(batch, use_multiple_actions)
+                except socket.error as e:
+                    if isinstance(e, socket.timeout):
+                        self._pop_replayed(entry)
+                    with self._lock:
+                        self._last_failed_connect = time.time()
+                    return False
+                except Exception as e:
+                    # The server answered with an error (eg a fault, or a
+                    # bad response); replaying the batch again would not help.
+                    aenea.metrics.increment('rpc.replay_errors')
+                    print 'Error replaying queued command to aenea server (%s), dropped it.' % e
+                    self._pop_replayed(entry)
+                    continue
+                aenea.metrics.increment('rpc.replayed')
+                replayed += 1
+                self._pop_replayed(entry)
+
+    def _pop_replayed(self, entry):
+        with self._lock:
+            if self._replay_queue and self._replay_queue[0] is entry:
+                self._replay_queue.popleft()
+
+
+class Proxy(object):
+    '''Sends commands to the active server. Keeps a pool of backends, one per
+       server in the servers of grammar_config/aenea.json (and one for the
+       active server, if it is not one of them), each probed in the
+       background and health checked every HEALTH_CHECK_INTERVAL seconds, so
+       switching between them is instant and does not need a new connection.
+       Servers removed from the configuration are removed from the pool when
+       it is reloaded.
+
+       The proxy follows the server in server_state.json (see
+       set_server_address), unless it is made for one address (host, port),
+       eg a stand-in server (see aenea.stand_in_server); switch() then
+       changes it. servers_config is the ConfigWatcher of the servers of the
+       pool, None for none but the active one.'''
+
+    def __init__(self, address=None, servers_config=_servers_config):
+        self._backends = {}
+        # Addresses of the servers in grammar_config/aenea.json.
+        self._configured = set()
+        self._servers_config = servers_config
+        self._backend = None
+        self._pool_lock = threading.Lock()
+        self._health_checker = None
+        self._follow_server_state = address is None
+        if address is not None:
+            self.switch(address)
+
+    @property
+    def _address(self):
+        return self._backend.address if self._backend is not None else None
+
+    @property
+    def last_connect_good(self):
+        return self._backend is not None and self._backend.last_connect_good
+
+    def _execute_batch(self, batch, use_multiple_actions=False):
+        self._refresh_server()
+        backend = self._backend
+        if backend is None:
+            return
+        return backend.execute_batch(batch, use_multiple_actions)
 
     def execute_batch(self, batch):
         self._execute_batch(batch, aenea.config.USE_MULTIPLE_ACTIONS)
@@ -109,16 +392,100 @@ class Proxy(object):
         return call
 
     def _refresh_server(self):
+        if not self._follow_server_state:
+            return
         _server_config.refresh()
         address = _server_config.conf['host'], _server_config.conf['port']
         if self._address != address:
-            self.last_connect_good = False
-            self._address = address
-            self._server = jsonrpclib.Server(
-                'http://%s:%i' % address,
-                transport=self._transport
+            self.switch(address)
+
+    def switch(self, address):
+        '''Makes address (host, port) the server commands go to.'''
+        address = (str(address[0]), int(address[1]))
+        with self._pool_lock:
+            self._refresh_pool()
+            backend = self._get_backend(address)
+            if backend is self._backend:
+                return
+            if self._backend is not None:
+                self._backend.deactivate()
+                if self._backend.address not in self._configured:
+                    self._remove_backend(self._backend.address)
+            backend.activate()
+            self._backend = backend
+            aenea.metrics.increment('pool.switches')
+            self._start_health_checker()
+        if backend._last_failed_connect and not backend.last_connect_good:
+            print 'aenea server %s:%i is not reachable at the moment, commands are queued until it is.' % address
+
+    def close(self):
+        '''Removes all servers from the pool (closing their connections and
+           ending their probers), eg when a proxy made for one address is
+           done.'''
+        with self._pool_lock:
+            for address in self._backends.keys():
+                self._remove_backend(address)
+            self._backend = None
+
+    def servers(self):
+        '''Returns [((host, port), reachable, active)] of the pool.'''
+        with self._pool_lock:
+            self._refresh_pool()
+            return sorted((address, backend.last_connect_good, backend.active)
+                          for (address, backend) in self._backends.iteritems())
+
+    def _get_backend(self, address):
+        '''Called with self._pool_lock held.'''
+        backend = self._backends.get(address)
+        if backend is None:
+            backend = self._backends[address] = _Backend(address)
+            aenea.metrics.increment('pool.backends')
+            # Connect in the background, ready for a switch.
+            with backend._lock:
+                backend._start_prober()
+        return backend
+
+    def _refresh_pool(self):
+        '''Called with self._pool_lock held.'''
+        if self._servers_config is None or not self._servers_config.refresh():
+            return
+        self._configured = set()
+        for entry in self._servers_config.conf.get('servers', {}).itervalues():
+            try:
+                address = (str(entry['host']), int(entry['port']))
+            except (KeyError, TypeError, ValueError):
+                print 'Invalid aenea server entry %r.' % (entry,)
+                continue
+            self._configured.add(address)
+            self._get_backend(address)
+        for address in self._backends.keys():
+            if (address not in self._configured and
+                    self._backends[address] is not self._backend):
+                self._remove_backend(address)
+
+    def _remove_backend(self, address):
+        '''Called with self._pool_lock held.'''
+        self._backends.pop(address).close()
+        aenea.metrics.increment('pool.removed')
+
+    def _start_health_checker(self):
+        '''Called with self._pool_lock held.'''
+        if self._health_checker is None and aenea.config.HEALTH_CHECK_INTERVAL:
+            self._health_checker = threading.Thread(
+                target=self._check_health,
+                name='aenea health check'
                 )
-            self._last_failed_connect = 0
+            self._health_checker.daemon = True
+            self._health_checker.start()
+
+    def _check_health(self):
+        while True:
+            time.sleep(aenea.config.HEALTH_CHECK_INTERVAL)
+            with self._pool_lock:
+                self._refresh_pool()
+                backends = self._backends.values()
+            for backend in backends:
+                backend.check_health()
 
 
 class BatchProxy(object):
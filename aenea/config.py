@@ -81,13 +81,42 @@ KEYS = _configuration.get('keys', [])
 KEY_TRANSLATIONS = _configuration.get('key_translations', {})
 MODIFIERS = _configuration.get('modifiers', {})
 
+# Longest wait between two connect probes of the background reconnect.
 CONNECT_RETRY_COOLDOWN = _configuration.get('connect_retry_cooldown', 5)
 
+# Commands issued while the server cannot be reached are queued and sent when
+# it is back, at most REPLAY_QUEUE_SIZE batches, none older than REPLAY_MAX_AGE
+# seconds. REPLAY_DROP_POLICY 'oldest' or 'newest' says which batch is dropped
+# when the queue is full.
+REPLAY_QUEUE_SIZE = _configuration.get('replay_queue_size', 200)
+REPLAY_MAX_AGE = _configuration.get('replay_max_age', 10)
+REPLAY_DROP_POLICY = _configuration.get('replay_drop_policy', 'oldest')
+
+# Seconds between health checks of the servers in the connection pool (the
+# servers of grammar_config/aenea.json), 0 to disable them.
+HEALTH_CHECK_INTERVAL = _configuration.get('health_check_interval', 10)
+
 STALE_CONTEXT_DELTA = _configuration.get('stale_context_delta', 0.025)
 
 CONNECT_TIMEOUT = _configuration.get('connect_timeout', 0.1)
 COMMAND_TIMEOUT = _configuration.get('command_timeout', 2)
 
+# Latency tracing (see aenea.tracing), off unless enabled: number of
+# recognitions kept in memory, and an optional file to append each trace to as
+# a JSON line.
+TRACE_ENABLED = _configuration.get('trace_enabled', False)
+TRACE_BUFFER_SIZE = _configuration.get('trace_buffer_size', 1000)
+TRACE_FILE = _configuration.get('trace_file', None)
+
+# Metrics (see aenea.metrics): a localhost port to serve them as JSON on,
+# and/or a file to write them to every METRICS_FILE_INTERVAL seconds.
+METRICS_HTTP_PORT = _configuration.get('metrics_http_port', None)
+METRICS_FILE = _configuration.get('metrics_file', None)
+METRICS_FILE_INTERVAL = _configuration.get('metrics_file_interval', 10)
+
+# File to record recognitions to, for replay (see aenea.recording).
+RECORD_FILE = _configuration.get('record_file', None)
+
 if _configuration.get('restrict_proxy_to_aenea_client', True):
     proxy_enable_context = dragonfly.AppContext(
         executable="python",
@@ -20,6 +20,7 @@ import os
 
 from aenea.alias import Alias
 import aenea.config
+import aenea.metrics
 from proxy_contexts import ProxyAppContext
 
 try:
@@ -73,6 +74,7 @@ class ConfigWatcher(object):
             return
         stat = os.stat(self._path)
         self._mtime_size = stat.st_mtime, stat.st_size
+        aenea.metrics.increment('config.reloads')
         try:
             with open(self._path) as fd:
                 self.conf = json.load(fd)
@@ -0,0 +1,164 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''In-process counters and histograms of the aenea client (RPC calls, bytes
+   sent, timeouts, queued and replayed commands, server switches and health
+   checks, cache hits and misses, vocabulary rebuilds and config reloads), to
+   tune STALE_CONTEXT_DELTA, COMMAND_TIMEOUT and CONNECT_RETRY_COOLDOWN. If
+   configured, the snapshot is served as JSON on
+   http://127.0.0.1:<metrics_http_port>/ and/or written to metrics_file every
+   metrics_file_interval seconds.'''
+
+import BaseHTTPServer
+import collections
+import json
+import threading
+import time
+
+import aenea.config
+import aenea.tracing
+
+# Number of recent values per histogram used for the percentiles.
+HISTOGRAM_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters = collections.defaultdict(int)
+_histograms = {}
+_started = time.time()
+_http_server = None
+_file_writer = None
+
+
+class Histogram(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+        self.samples = collections.deque(maxlen=HISTOGRAM_SAMPLES)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def to_dict(self):
+        result = {'count': self.count, 'sum': self.total,
+                  'min': self.min, 'max': self.max}
+        for p in (50, 95, 99):
+            result['p%i' % p] = aenea.tracing.percentile(self.samples, p)
+        return result
+
+
+def increment(name, value=1):
+    '''Adds value to the counter name.'''
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, value):
+    '''Adds value (eg a duration in seconds) to the histogram name.'''
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+
+def snapshot():
+    '''Returns all counters and histograms as a JSON serialisable dict.'''
+    with _lock:
+        return {
+            'time': time.time(),
+            'uptime': time.time() - _started,
+            'counters': dict(_counters),
+            'histograms': dict((name, histogram.to_dict())
+                               for (name, histogram) in _histograms.iteritems())
+            }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def write_json(path):
+    '''Writes the snapshot to path.'''
+    try:
+        with open(path, 'w') as fd:
+            json.dump(snapshot(), fd, indent=1, sort_keys=True)
+    except Exception as e:
+        print 'Error writing metrics file %s: %s.' % (path, str(e))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(snapshot(), indent=1, sort_keys=True)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *a):
+        pass
+
+
+def start_http_server(port):
+    '''Serves the snapshot on http://127.0.0.1:port/ from a daemon thread.'''
+    global _http_server
+    if _http_server is not None:
+        return _http_server
+    _http_server = BaseHTTPServer.HTTPServer(('127.0.0.1', port), _Handler)
+    thread = threading.Thread(target=_http_server.serve_forever,
+                              name='aenea metrics http')
+    thread.daemon = True
+    thread.start()
+    return _http_server
+
+
+def start_file_writer(path, interval):
+    '''Writes the snapshot to path every interval seconds from a daemon
+       thread.'''
+    global _file_writer
+
+    def run():
+        while True:
+            time.sleep(interval)
+            write_json(path)
+
+    if _file_writer is None:
+        _file_writer = threading.Thread(target=run, name='aenea metrics file')
+        _file_writer.daemon = True
+        _file_writer.start()
+    return _file_writer
+
+
+def start():
+    '''Starts the endpoint and file writer that are configured in aenea.json
+       (metrics_http_port, metrics_file).'''
+    if aenea.config.METRICS_HTTP_PORT:
+        try:
+            start_http_server(aenea.config.METRICS_HTTP_PORT)
+        except Exception as e:
+            print 'Error starting metrics endpoint on port %s: %s.' % (
+                aenea.config.METRICS_HTTP_PORT, str(e))
+    if aenea.config.METRICS_FILE:
+        start_file_writer(aenea.config.METRICS_FILE,
+                          aenea.config.METRICS_FILE_INTERVAL)
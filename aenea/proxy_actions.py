@@ -20,7 +20,10 @@
 
 import aenea.communications
 import aenea.config
+import aenea.metrics
 import aenea.proxy_contexts
+import aenea.recording
+import aenea.tracing
 
 try:
     import dragonfly
@@ -89,7 +92,25 @@ class ProxyKey(ProxyBase, dragonfly.DynStrActionBase):
 
     _parser = _make_key_parser()
 
+    # Parsed specs (dynamic specs like 'backspace:%(n)d' are parsed at each
+    # execute); the commands only depend on the spec.
+    _parse_cache = {}
+    _parse_cache_size = 1000
+
     def _parse_spec(self, spec):
+        with aenea.tracing.span('parse_spec'):
+            commands = self._parse_cache.get(spec)
+            if commands is None:
+                aenea.metrics.increment('key_parse.cache_misses')
+                commands = self._parse_key_spec(spec)
+                if len(self._parse_cache) >= self._parse_cache_size:
+                    self._parse_cache.clear()
+                self._parse_cache[spec] = commands
+            else:
+                aenea.metrics.increment('key_parse.cache_hits')
+            return list(commands)
+
+    def _parse_key_spec(self, spec):
         proxy = aenea.communications.BatchProxy()
         for key in spec.split(','):
             modifier_part, key_part, command_part, outer_pause_part = \
@@ -127,6 +148,7 @@ class ProxyKey(ProxyBase, dragonfly.DynStrActionBase):
         return proxy._commands
 
     def _execute_events(self, commands):
+        aenea.recording.add_action('key', commands)
         aenea.communications.server.execute_batch(commands)
 
 ###############################################################################
@@ -138,6 +160,7 @@ class ProxyText(ProxyBase, dragonfly.DynStrActionBase):
         return spec
 
     def _execute_events(self, events):
+        aenea.recording.add_action('text', events)
         aenea.communications.server.write_text(text=events)
 
 ###############################################################################
@@ -149,6 +172,7 @@ class ProxyNotification(ProxyBase, dragonfly.DynStrActionBase):
         return spec
 
     def _execute_events(self, events):
+        aenea.recording.add_action('notify', events)
         aenea.communications.server.notify(events)
     
 
@@ -201,6 +225,7 @@ class ProxyMouse(ProxyBase, dragonfly.DynStrActionBase):
         return proxy._commands
 
     def _execute_events(self, commands):
+        aenea.recording.add_action('mouse', commands)
         aenea.communications.server.execute_batch(commands)
 
 ###############################################################################
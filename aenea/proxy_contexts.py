@@ -22,6 +22,8 @@ import time
 
 import aenea.communications
 import aenea.config
+import aenea.metrics
+import aenea.tracing
 
 try:
     import dragonfly
@@ -60,8 +62,10 @@ def _refresh_server():
     if (
             _last_context_time is None or
             _last_context_time + aenea.config.STALE_CONTEXT_DELTA < time.time()):
-        _last_context = aenea.communications.server.get_context()
-        _last_server_info = aenea.communications.server.server_info()
+        aenea.metrics.increment('context.cache_misses')
+        with aenea.tracing.span('context_refresh'):
+            _last_context = aenea.communications.server.get_context()
+            _last_server_info = aenea.communications.server.server_info()
         _last_context_time = time.time()
 
         # If the RPC call fails for whatever reason, we return an empty dict.
@@ -69,6 +73,8 @@ def _refresh_server():
             _last_context = {}
         if _last_server_info is None:
             _last_server_info = {}
+    else:
+        aenea.metrics.increment('context.cache_hits')
 
 
 def _get_context():
@@ -0,0 +1,270 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Records recognitions to a compact log, and replays them offline as a load
+   test of the client pipeline.
+
+   Each recognition is one JSON line:
+
+       {"t": 1490000000.1, "duration": 0.012, "rule": "RepeatRule",
+        "words": ["camel", "hello", "world"], "extras": {"n": 1},
+        "rules": [["FormatRule", ["camel", "hello", "world"]]],
+        "actions": [["text", "helloWorld"], ["key", [...]]]}
+
+   rules are the sub-rules that were evaluated (FormatRule, KeystrokeRule,
+   NopeFormatRule, ProgramsRule),
+   actions are the events the proxy actions sent to the server.
+
+   Set record_file in aenea.json to record. To replay against a stand-in
+   server (see aenea.stand_in_server), at 4x the recorded speed:
+
+       python -m aenea.recording replay session.jsonl --speed 4 --latency 0.002
+
+   The grammars (words.py, keyboard.py, ...) need dragonfly and natlink, so
+   they cannot be loaded for the replay: it starts at the proxy actions, and
+   sends the recorded actions through aenea.communications (so the RPCs,
+   connection handling, tracing and metrics are included, the rules' value()
+   code and the parsing of action specs are not). A caller with dragonfly
+   can pass rule_handlers to replay() to make the actions of sub-rules from
+   their recorded words instead. The replay does not change the configured
+   server (server_state.json): it uses a Proxy of its own.'''
+
+import json
+import threading
+import time
+
+import aenea.communications
+import aenea.config
+import aenea.tracing
+
+_lock = threading.Lock()
+_file = None
+_current = None
+
+
+def start(path=None):
+    '''Starts recording to path (default: record_file from aenea.json).'''
+    global _file
+    path = path or aenea.config.RECORD_FILE
+    if not path:
+        return
+    with _lock:
+        if _file is None:
+            try:
+                _file = open(path, 'a')
+            except IOError as e:
+                print 'Error opening record file %s: %s.' % (path, str(e))
+
+
+def stop():
+    global _file
+    with _lock:
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+def recording():
+    return _file is not None
+
+
+def begin(rule, words):
+    '''Begins the record of a recognition. Returns the record, or None if
+       not recording (or already recording a recognition).'''
+    global _current
+    if _file is None or _current is not None:
+        return None
+    _current = {'t': time.time(), 'rule': rule, 'words': list(words),
+                'extras': {}, 'rules': [], 'actions': []}
+    return _current
+
+
+def end(record):
+    global _current
+    if record is None:
+        return
+    if _current is record:
+        _current = None
+    record['duration'] = time.time() - record['t']
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with _lock:
+        if _file is not None:
+            _file.write(line)
+            _file.flush()
+
+
+def add_extras(extras):
+    '''Adds the JSON serialisable extras to the current record.'''
+    if _current is None:
+        return
+    for (name, value) in extras.iteritems():
+        if isinstance(value, (basestring, int, long, float, bool)):
+            _current['extras'][name] = value
+
+
+def add_rule(rule, words):
+    if _current is not None:
+        _current['rules'].append([rule, list(words)])
+
+
+def add_action(kind, events):
+    '''kind is 'key', 'mouse', 'text' or 'notify', events what the proxy
+       action sends (a batch of commands, or a string).'''
+    if _current is not None:
+        _current['actions'].append([kind, events])
+
+
+def read(path):
+    '''Returns the records of path.'''
+    with open(path) as fd:
+        return [json.loads(line) for line in fd if line.strip()]
+
+
+def _replay_actions(record):
+    server = aenea.communications.server
+    for (kind, events) in record['actions']:
+        if kind in ('key', 'mouse'):
+            server.execute_batch(events)
+        elif kind == 'text':
+            server.write_text(text=events)
+        elif kind == 'notify':
+            server.notify(events)
+
+
+def _rule_actions(record, rule_handlers):
+    '''Returns the actions of the sub-rules of record, or None if one of them
+       has no handler, or its handler cannot make its actions.'''
+    if not record['rules']:
+        return None
+    result = []
+    for (rule, words) in record['rules']:
+        handler = rule_handlers.get(rule)
+        if handler is None:
+            return None
+        with aenea.tracing.span('value', rule=rule):
+            actions = handler(words)
+        if actions is None:
+            return None
+        result.extend(actions)
+    return result
+
+
+def replay(records, speed=1., rule_handlers=None):
+    '''Replays records, keeping the recorded gaps between recognitions
+       divided by speed (speed 0: as fast as possible). rule_handlers maps a
+       sub-rule name to a handler, that returns the actions of the recorded
+       words of its sub-rule (or None if it cannot make them); recognitions
+       of which every sub-rule has a handler execute the actions of the
+       handlers (as many times as extras n), others send their recorded
+       actions. Returns a report dict with throughput and latencies
+       (seconds).'''
+    rule_handlers = rule_handlers or {}
+    durations = []
+    lags = []
+    actions = 0
+    handled = 0
+    if not records:
+        return {'recognitions': 0}
+    first = records[0]['t']
+    start = time.time()
+    for record in records:
+        if speed:
+            due = start + (record['t'] - first) / speed
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                lags.append(-wait)
+        t0 = time.time()
+        with aenea.tracing.recognition(record['rule'], record['words']):
+            for (rule, words) in record['rules']:
+                aenea.tracing.add_rule(rule)
+            rule_actions = _rule_actions(record, rule_handlers)
+            if rule_actions is not None:
+                handled += 1
+                for i in range(record['extras'].get('n', 1)):
+                    for action in rule_actions:
+                        action.execute()
+            else:
+                _replay_actions(record)
+        durations.append(time.time() - t0)
+        actions += len(record['actions'])
+    elapsed = time.time() - start
+    report = {
+        'recognitions': len(records),
+        'handled': handled,
+        'actions': actions,
+        'elapsed': elapsed,
+        'recognitions_per_second': len(records) / elapsed if elapsed else None,
+        'actions_per_second': actions / elapsed if elapsed else None,
+        'max_lag': max(lags) if lags else 0.,
+        }
+    for p in (50, 95, 99):
+        report['p%i' % p] = aenea.tracing.percentile(durations, p)
+    report['max'] = max(durations)
+    return report
+
+
+def print_report(report):
+    print '%(recognitions)i recognitions, %(actions)i actions in %(elapsed).2fs' % report
+    if report.get('handled'):
+        print '%(handled)i recognitions replayed through the rule handlers' % report
+    if report['recognitions']:
+        print '%.1f recognitions/s, %.1f actions/s, max lag %.1fms' % (
+            report['recognitions_per_second'], report['actions_per_second'],
+            report['max_lag'] * 1000)
+        print 'latency p50 %.1fms p95 %.1fms p99 %.1fms max %.1fms' % tuple(
+            report[k] * 1000 for k in ('p50', 'p95', 'p99', 'max'))
+
+
+def main():
+    import argparse
+    import aenea.stand_in_server
+    parser = argparse.ArgumentParser(description='Replay recorded recognitions.')
+    parser.add_argument('command', choices=('replay',))
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=1.,
+                        help='0 replays as fast as possible')
+    parser.add_argument('--server', default=None,
+                        help='host:port of a server; default a stand-in server')
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--jitter', type=float, default=0.)
+    args = parser.parse_args()
+    # The summary printed after the replay is made of the traces.
+    aenea.config.TRACE_ENABLED = True
+
+    stand_in = None
+    if args.server:
+        host, port = args.server.rsplit(':', 1)
+        address = (host, int(port))
+    else:
+        stand_in = aenea.stand_in_server.StandInServer(
+            latency=args.latency, jitter=args.jitter).start()
+        address = stand_in.address
+    # The proxy actions send to aenea.communications.server; for the replay
+    # that is a proxy for address only, not the configured server(s).
+    configured = aenea.communications.server
+    proxy = aenea.communications.server = aenea.communications.Proxy(address, None)
+    try:
+        print_report(replay(read(args.path), args.speed))
+        aenea.tracing.print_summary()
+    finally:
+        aenea.communications.server = configured
+        proxy.close()
+        if stand_in is not None:
+            stand_in.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''A stand-in for the aenea JSON-RPC server, for testing and benchmarking the
+   client without a Linux machine. It implements the RPC methods the client
+   uses, records every call, and can add latency, jitter and failures.
+
+   From a test:
+
+       server = StandInServer(latency=0.005, jitter=0.002).start()
+       proxy = aenea.communications.Proxy(server.address, None)
+       proxy.key_press(key='a')
+       proxy.write_text(text='hello')
+       ...
+       assert server.methods() == ['key_press', 'write_text']
+       server.stop()
+
+   Or standalone (eg for aenea_client.py):
+
+       python -m aenea.stand_in_server --port 8240 --latency 0.01'''
+
+import collections
+import random
+import socket
+import SocketServer
+import sys
+import threading
+import time
+
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+
+
+class InjectedFailure(Exception):
+    '''Raised for a call that should fail; the client sees a JSON-RPC
+       error.'''
+
+
+class _ThreadingServer(SocketServer.ThreadingMixIn, SimpleJSONRPCServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # A client that timed out (eg on failure_mode 'hang') has closed the
+        # connection before the answer; that is no error of the server.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            SimpleJSONRPCServer.handle_error(self, request, client_address)
+
+
+class Call(object):
+    '''One recorded RPC call. Calls inside multiple_actions are recorded
+       too, with parent set to the multiple_actions call.'''
+
+    def __init__(self, method, params, parent=None):
+        self.time = time.time()
+        self.method = method
+        self.params = params
+        self.parent = parent
+
+    def __repr__(self):
+        return 'Call(%r, %r)' % (self.method, self.params)
+
+
+class StandInServer(object):
+    '''Implements key_press, write_text, click_mouse, move_mouse, pause,
+       multiple_actions, get_context, server_info, notify, change_OS,
+       showWindowList and shelfCommand.
+
+       Every call waits latency seconds plus or minus up to jitter seconds.
+       With probability failure_rate a call fails: failure_mode 'fault'
+       returns a JSON-RPC error, 'hang' waits hang_time seconds first (to
+       make the client time out). fail_next(n) makes the next n calls fail.
+       All settings can be changed while the server runs (see configure).
+       Only the last max_calls calls are kept in calls.'''
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0., jitter=0.,
+                 failure_rate=0., failure_mode='fault', hang_time=5.,
+                 platform='linux', context=None, seed=None, max_calls=10000):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.hang_time = hang_time
+        self.platform = platform
+        self.context = context if context is not None else {
+            'id': 'stand-in', 'title': 'stand-in window', 'cls': 'xterm',
+            'cls_name': 'xterm', 'executable': '/usr/bin/xterm'}
+        self.calls = collections.deque(maxlen=max_calls)
+        self.os = 'Linux'
+        self._fail_next = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = _ThreadingServer((host, port), logRequests=False)
+        self._server.register_instance(self)
+
+    @property
+    def address(self):
+        '''(host, port) the server listens on.'''
+        return self._server.server_address[:2]
+
+    def start(self):
+        '''Serves from a daemon thread. Returns self.'''
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='aenea stand-in server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # shutdown() waits for serve_forever, so only after start().
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def configure(self, **settings):
+        '''Changes latency, jitter, failure_rate etc.'''
+        for (name, value) in settings.iteritems():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise AttributeError('unknown setting %s' % name)
+            setattr(self, name, value)
+
+    def fail_next(self, count=1):
+        with self._lock:
+            self._fail_next += count
+
+    def methods(self, top_level=False):
+        '''Names of the recorded calls, in order.'''
+        with self._lock:
+            return [call.method for call in self.calls
+                    if not (top_level and call.parent)]
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _record(self, method, params, parent=None):
+        call = Call(method, params, parent)
+        with self._lock:
+            self.calls.append(call)
+        return call
+
+    def _should_fail(self):
+        with self._lock:
+            if self._fail_next:
+                self._fail_next -= 1
+                return True
+        return self.failure_rate and self._random.random() < self.failure_rate
+
+    def _dispatch(self, method, params):
+        '''Called by the JSON-RPC server for each request.'''
+        handler = getattr(self, 'rpc_' + method, None)
+        if handler is None:
+            raise AttributeError('method %s not found' % method)
+        call = self._record(method, params)
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if self._should_fail():
+            if self.failure_mode == 'hang':
+                time.sleep(self.hang_time)
+            raise InjectedFailure('injected failure in %s' % method)
+        if delay > 0:
+            time.sleep(delay)
+        return self._call(handler, params, call)
+
+    def _call(self, handler, params, call):
+        if isinstance(params, dict):
+            return handler(call, **params)
+        return handler(call, *(params or ()))
+
+    # The RPC methods; call is the recorded Call.
+
+    def rpc_key_press(self, call, key=None, modifiers=(), direction='press',
+                      count=1, count_delay=None):
+        pass
+
+    def rpc_write_text(self, call, text):
+        pass
+
+    def rpc_click_mouse(self, call, button, direction='click', count=1,
+                        count_delay=None):
+        pass
+
+    def rpc_move_mouse(self, call, x, y, reference='absolute',
+                       proportional=False, phantom=None):
+        pass
+
+    def rpc_pause(self, call, amount):
+        pass
+
+    def rpc_multiple_actions(self, call, actions):
+        for (method, args, kwargs) in actions:
+            handler = getattr(self, 'rpc_' + method, None)
+            if handler is None:
+                raise AttributeError('method %s not found' % method)
+            sub_call = self._record(method, kwargs or args, call)
+            self._call(handler, kwargs or args, sub_call)
+
+    def rpc_get_context(self, call):
+        return dict(self.context)
+
+    def rpc_server_info(self, call):
+        return {'window_manager': 'stand-in', 'operating_system': self.os,
+                'platform': self.platform, 'display': 'stand-in',
+                'server': 'aenea stand-in server', 'server_version': 1}
+
+    def rpc_notify(self, call, message):
+        pass
+
+    def rpc_change_OS(self, call, os):
+        self.os = os
+
+    def rpc_showWindowList(self, call):
+        pass
+
+    def rpc_shelfCommand(self, call, value):
+        pass
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8240)
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--jitter', type=float, default=0.)
+    parser.add_argument('--failure-rate', type=float, default=0.)
+    parser.add_argument('--failure-mode', choices=('fault', 'hang'),
+                        default='fault')
+    parser.add_argument('--platform', default='linux')
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port, latency=args.latency,
+                           jitter=args.jitter, failure_rate=args.failure_rate,
+                           failure_mode=args.failure_mode,
+                           platform=args.platform)
+    print 'aenea stand-in server listening on %s:%i' % server.address
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        print '%i calls' % len(server.calls)
+
+
+if __name__ == '__main__':
+    main()
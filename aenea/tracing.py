@@ -0,0 +1,219 @@
+# This file is part of Aenea
+#
+# Aenea is free software: you can redistribute it and/or modify it under
+# the terms of version 3 of the GNU Lesser General Public License as
+# published by the Free Software Foundation.
+#
+# Aenea is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with Aenea.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Per utterance latency tracing. A trace is begun when a recognition is
+   dispatched to a rule (see RepeatRule in _all.py), the rules it dispatches
+   to (FormatRule, KeystrokeRule, ...) add their name, and the stages of the
+   client pipeline (value(), spec parsing, context refresh and server RPCs)
+   add timed spans to the current trace of their thread. Finished traces are
+   kept in a ring buffer and optionally appended to a JSONL file.'''
+
+import collections
+import contextlib
+import functools
+import itertools
+import json
+import threading
+import time
+
+import aenea.config
+
+_local = threading.local()
+_ids = itertools.count(1)
+_file_lock = threading.Lock()
+_trace_file = None
+
+# Most recent finished traces, oldest first.
+traces = collections.deque(maxlen=aenea.config.TRACE_BUFFER_SIZE)
+
+
+class Trace(object):
+    '''Timestamps of one recognition. rules are the rules it dispatched to,
+       in order. Spans are (stage, offset, duration, info) with offset and
+       duration in seconds, offset relative to start.'''
+
+    def __init__(self, rule, words=None):
+        self.id = next(_ids)
+        self.rule = rule
+        self.words = words
+        self.start = time.time()
+        self.duration = None
+        self.rules = []
+        self.spans = []
+
+    def add_span(self, stage, start, end, info=None):
+        self.spans.append((stage, start - self.start, end - start, info))
+
+    def add_rule(self, rule):
+        if rule not in self.rules:
+            self.rules.append(rule)
+
+    def label(self):
+        '''The rules the recognition dispatched to (eg 'KeystrokeRule' or
+           'KeystrokeRule+FormatRule'), or the rule it began in.'''
+        return '+'.join(self.rules) or self.rule
+
+    def stage_durations(self, stage):
+        return [duration for (name, _, duration, _) in self.spans
+                if name == stage]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rule': self.rule,
+            'rules': self.rules,
+            'words': self.words,
+            'start': self.start,
+            'duration': self.duration,
+            'spans': [
+                {'stage': stage, 'offset': offset, 'duration': duration,
+                 'info': info}
+                for (stage, offset, duration, info) in self.spans
+                ]
+            }
+
+
+def current():
+    '''Returns the trace of the recognition this thread is handling, or
+       None.'''
+    return getattr(_local, 'trace', None)
+
+
+def begin(rule, words=None):
+    '''Begins a trace for a recognition of rule. Returns None if tracing is
+       disabled or this thread is already tracing (eg for a Mimic inside an
+       action); the nested work is then part of the outer trace.'''
+    if not aenea.config.TRACE_ENABLED or current() is not None:
+        return None
+    trace = Trace(rule, words)
+    _local.trace = trace
+    return trace
+
+
+def end(trace):
+    '''Finishes trace (which may be None, see begin) and stores it.'''
+    if trace is None:
+        return
+    trace.duration = time.time() - trace.start
+    if current() is trace:
+        _local.trace = None
+    traces.append(trace)
+    if aenea.config.TRACE_FILE:
+        _write(trace)
+
+
+def add_rule(rule):
+    '''Adds rule to the rules the current trace, if any, dispatched to.'''
+    trace = current()
+    if trace is not None:
+        trace.add_rule(rule)
+
+
+@contextlib.contextmanager
+def span(stage, **info):
+    '''Times the enclosed block as stage of the current trace, if any.'''
+    trace = current()
+    if trace is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        trace.add_span(stage, start, time.time(), info or None)
+
+
+@contextlib.contextmanager
+def recognition(rule, words=None):
+    '''Traces the enclosed block as a recognition of rule (see begin and
+       end). Yields the trace, or None.'''
+    trace = begin(rule, words)
+    try:
+        yield trace
+    finally:
+        end(trace)
+
+
+def traced_value(rule):
+    '''Decorator for the value() method of a rule the recognition dispatches
+       to: adds rule to the current trace and times the call as its value
+       stage.'''
+    def decorate(value):
+        @functools.wraps(value)
+        def traced(self, node):
+            add_rule(rule)
+            with span('value', rule=rule):
+                return value(self, node)
+        return traced
+    return decorate
+
+
+def _write(trace):
+    global _trace_file
+    line = json.dumps(trace.to_dict()) + '\n'
+    with _file_lock:
+        try:
+            if _trace_file is None:
+                _trace_file = open(aenea.config.TRACE_FILE, 'a')
+            _trace_file.write(line)
+            _trace_file.flush()
+        except IOError as e:
+            print 'Error writing trace file %s: %s.' % (aenea.config.TRACE_FILE, str(e))
+
+
+def percentile(values, p):
+    '''Nearest rank percentile of values (p from 0 to 100).'''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(int(round(p / 100. * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summary(stage=None):
+    '''Returns {rules: {'count', 'p50', 'p95', 'p99'}} in milliseconds, of
+       the total duration of the traces in the buffer or, if stage is given,
+       of the time spent in that stage. rules is the label of the traces (the
+       rules they dispatched to, see Trace.label).'''
+    durations = collections.defaultdict(list)
+    for trace in list(traces):
+        if stage is None:
+            durations[trace.label()].append(trace.duration)
+        else:
+            spent = trace.stage_durations(stage)
+            if spent:
+                durations[trace.label()].append(sum(spent))
+    result = {}
+    for rule, values in durations.iteritems():
+        result[rule] = {'count': len(values)}
+        for p in (50, 95, 99):
+            result[rule]['p%i' % p] = percentile(values, p) * 1000.
+    return result
+
+
+def print_summary():
+    '''Prints the total and per stage latencies of the buffered traces, per
+       combination of rules.'''
+    stages = sorted(set(span[0] for trace in list(traces)
+                        for span in trace.spans))
+    for stage in [None] + stages:
+        for rule, values in sorted(summary(stage).iteritems()):
+            print '%-30s %-20s n=%-5i p50=%7.1fms p95=%7.1fms p99=%7.1fms' % (
+                rule, stage or 'total', values['count'], values['p50'],
+                values['p95'], values['p99'])
+
+
+def clear():
+    '''Forgets the buffered traces.'''
+    traces.clear()
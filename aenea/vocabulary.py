@@ -64,8 +64,11 @@ except ImportError:
     class Key(ActionMock):
         pass
 
+import time
+
 import aenea.config
 import aenea.configuration
+import aenea.metrics
 
 _vocabulary = {'static': {}, 'dynamic': {}}
 
@@ -109,6 +112,7 @@ def refresh_vocabulary(force_reload=False):
     global _vocabulary
 
     if force_reload or any(w.refresh() for w in _watchers.itervalues()):
+        aenea.metrics.increment('vocabulary.reloads')
         for vocabulary in 'static', 'dynamic':
             for kind in _vocabulary[vocabulary].itervalues():
                 del kind[:]
@@ -157,6 +161,7 @@ def _rebuild_lists(vocabulary):
     global _vocabulary_inhibitions
     global _list_of_dynamic_vocabularies
 
+    start = time.time()
     if vocabulary == 'dynamic':
         if _global_list is not None:
             _global_list.clear()
@@ -190,6 +195,9 @@ def _rebuild_lists(vocabulary):
     if _list_of_dynamic_vocabularies is not None:
         _list_of_dynamic_vocabularies.set(_vocabulary['dynamic'])
 
+    aenea.metrics.observe('vocabulary.rebuild_seconds.%s' % vocabulary,
+                          time.time() - start)
+
 
 def get_static_vocabulary(tag):
     '''Returns a dict of string to dragonfly.ActionBase-derived.'''
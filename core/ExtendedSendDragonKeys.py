@@ -11,8 +11,15 @@
 ### Version: 0.7
 ### 
 
+import sys
 import re
-import win32con
+import collections
+if sys.platform == 'win32':
+    import win32con
+else:
+    # off Windows only the parsing (parse_into_chords) and the chord cache
+    # can be used, eg for testing:
+    win32con = None
 
 from ctypes    import *
 from SendInput import *
@@ -26,11 +33,13 @@ debug = False
 #
 def senddragonkeys_to_events(input, ignore_unknown_names=True):
     chords = parse_into_chords(input)
+    # the events of a chord depend on keyboard layout and mouse buttons swap:
+    context = (GetKeyboardLayout(0), GetSystemMetrics(win32con.SM_SWAPBUTTON))
 
-    events = []
+    parts = []
     for c in chords:
         try:
-            events += chord_to_events(c)
+            parts.append(cached_chord_to_events(c, context))
         except LookupError, e:
             if not ignore_unknown_names: 
                 raise
@@ -40,10 +49,46 @@ def senddragonkeys_to_events(input, ignore_unknown_names=True):
             if debug:
                 print "typing out bad chord: " + characters + ": " + repr(e)
             for char in characters:
-                events += chord_to_events([None, char, None, char])
+                parts.append(cached_chord_to_events([None, char, None, char],
+                                                    context))
+
+    events = [None] * sum(map(len, parts))
+    i = 0
+    for part in parts:
+        events[i:i+len(part)] = part
+        i += len(part)
+    return events
+
+
+## 
+## Chord text -> (tuple of events, warnings) cache, least recently used
+## chords are dropped first.  Chords that raise an error are not cached.
+## The warnings of a chord are printed again at each use; with debug on,
+## the cache is not used, so the debug output is printed each time too.
+## 
 
+chord_cache      = collections.OrderedDict()
+chord_cache_size = 1000
+
+def cached_chord_to_events(chord, context):
+    if debug:
+        return chord_to_events(chord)
+    key = (chord[3], context)
+    try:
+        events, warnings = chord_cache.pop(key)
+    except KeyError:
+        warnings = []
+        events = tuple(chord_to_events(chord, warnings))
+        if len(chord_cache) >= chord_cache_size:
+            chord_cache.popitem(last=False)
+    chord_cache[key] = events, warnings
+    for message in warnings:
+        print message
     return events
 
+def clear_chord_cache():
+    chord_cache.clear()
+
     
 
 ### 
@@ -61,17 +106,14 @@ def senddragonkeys_to_events(input, ignore_unknown_names=True):
 def parse_into_chords(specification):
     chords = []
     
-    while len(specification) > 0:
-        m = chord_pattern.match(specification)
-        if m:
+    for m in token_pattern.finditer(specification):
+        char = m.group('char')
+        if char is None:
             modifiers = m.group(1)
             if modifiers: modifiers = modifiers[:-1]  # remove final "+"
-            chords += [[modifiers, m.group(2), m.group(3), m.group(0)]]
-            specification = specification[m.end():]
+            chords.append([modifiers, m.group(2), m.group(3), m.group(0)])
         else:
-            char = specification[0]
-            chords += [[None, char, None, char]]
-            specification = specification[1:]
+            chords.append([None, char, None, char])
     
     return chords
 
@@ -82,12 +124,18 @@ chord_pattern = re.compile(r"""\{ ( (?: [a-zA-Z0-9\x80-\xff]+ \+ )* )
                                   (?: [ _] (\d+|hold|release) )?
                                \}""", re.VERBOSE|re.IGNORECASE)
 
+# A chord, or else any single character (including newlines), so one
+# left to right pass over the specification gives all the chords:
+token_pattern = re.compile(chord_pattern.pattern + r" | (?P<char> [\s\S] )",
+                           re.VERBOSE|re.IGNORECASE)
+
 
 ### 
 ### 
 ### 
 
-def chord_to_events(chord):
+# warnings is None: print the warnings, otherwise append them to it:
+def chord_to_events(chord, warnings=None):
     modifiers, base, effect, text = chord
     if base == " ":
         base = "space"
@@ -150,14 +198,17 @@ def chord_to_events(chord):
             raise
 
     if len(modifiers) != 0:
-        print "Warning: unable to use modifiers with character: " + base
+        warn("Warning: unable to use modifiers with character: " + base,
+             warnings)
     
     # Unicode?
     
     if release_count==0:
-        print "Warning: unable to independently hold character: " + base
+        warn("Warning: unable to independently hold character: " + base,
+             warnings)
     if hold_count==0:
-        print "Warning: unable to independently release character: " + base
+        warn("Warning: unable to independently release character: " + base,
+             warnings)
         return []
 
     if debug:
@@ -166,6 +217,14 @@ def chord_to_events(chord):
 
 
 
+def warn(message, warnings):
+    if warnings is None:
+        print message
+    else:
+        warnings.append(message)
+
+
+
 ### 
 ### Pressing/releasing a single generalized virtual key or mouse button
 ### 
@@ -378,9 +437,10 @@ Button_name = {
     }
 
 
-GetSystemMetrics = windll.user32.GetSystemMetrics
-GetSystemMetrics.argtypes = [c_int]
-GetSystemMetrics.restype  = c_int
+if sys.platform == 'win32':
+    GetSystemMetrics = windll.user32.GetSystemMetrics
+    GetSystemMetrics.argtypes = [c_int]
+    GetSystemMetrics.restype  = c_int
 
 # Convert ExtendSendDragonKeys mouse button names to those required
 # by SendInput.py, swapping left & right buttons if user has "Switch
@@ -430,17 +490,18 @@ SHORT  = c_short        # 16 bits
 TCHAR  = c_wchar        # if using Unicode
 HKL    = HANDLE = PVOID = c_void_p
 
-GetKeyboardLayout = windll.user32.GetKeyboardLayout
-GetKeyboardLayout.argtypes = [DWORD]
-GetKeyboardLayout.restype  = HKL
+if sys.platform == 'win32':
+    GetKeyboardLayout = windll.user32.GetKeyboardLayout
+    GetKeyboardLayout.argtypes = [DWORD]
+    GetKeyboardLayout.restype  = HKL
 
-VkKeyScan = windll.user32.VkKeyScanW
-VkKeyScan.argtypes = [TCHAR]
-VkKeyScan.restype  = SHORT
+    VkKeyScan = windll.user32.VkKeyScanW
+    VkKeyScan.argtypes = [TCHAR]
+    VkKeyScan.restype  = SHORT
 
-VkKeyScanEx = windll.user32.VkKeyScanExW
-VkKeyScanEx.argtypes = [TCHAR, HKL]
-VkKeyScanEx.restype  = SHORT
+    VkKeyScanEx = windll.user32.VkKeyScanExW
+    VkKeyScanEx.argtypes = [TCHAR, HKL]
+    VkKeyScanEx.restype  = SHORT
 
 
 def how_type_character(char):
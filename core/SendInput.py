@@ -13,8 +13,14 @@
 ### Version: 0.6
 ### 
 
+import sys
 from ctypes import *
-import win32con
+if sys.platform == 'win32':
+    import win32con
+else:
+    # off Windows only the names and constants can be used (eg by the tests
+    # of ExtendedSendDragonKeys):
+    win32con = None
 
 
 ## 
@@ -406,17 +412,18 @@ def unpack_generalized_key_code(generalized_key_code):
 HKL  = HANDLE = PVOID = c_void_p
 UINT = c_uint
 
-GetKeyboardLayout = windll.user32.GetKeyboardLayout
-GetKeyboardLayout.argtypes = [DWORD]
-GetKeyboardLayout.restype  = HKL
+if sys.platform == 'win32':
+    GetKeyboardLayout = windll.user32.GetKeyboardLayout
+    GetKeyboardLayout.argtypes = [DWORD]
+    GetKeyboardLayout.restype  = HKL
 
-MapVirtualKey = windll.user32.MapVirtualKeyW
-MapVirtualKey.argtypes = [UINT, UINT]
-MapVirtualKey.restype  = UINT
+    MapVirtualKey = windll.user32.MapVirtualKeyW
+    MapVirtualKey.argtypes = [UINT, UINT]
+    MapVirtualKey.restype  = UINT
 
-MapVirtualKeyEx = windll.user32.MapVirtualKeyExW
-MapVirtualKeyEx.argtypes = [UINT, UINT, HKL]
-MapVirtualKeyEx.restype  = UINT
+    MapVirtualKeyEx = windll.user32.MapVirtualKeyExW
+    MapVirtualKeyEx.argtypes = [UINT, UINT, HKL]
+    MapVirtualKeyEx.restype  = UINT
 
 
 def scan_code(virtual_key_code):
@@ -468,15 +475,18 @@ def Unicode_event(char_code, releasing=False):
 # primary mouse button.  (These differ if the user has "Switch primary
 # and secondary buttons" selected.)  Ditto for right.
 
-Mouse_buttons = { 
-    "left"  : [win32con.MOUSEEVENTF_LEFTDOWN,   win32con.MOUSEEVENTF_LEFTUP,   0],
-    "right" : [win32con.MOUSEEVENTF_RIGHTDOWN,  win32con.MOUSEEVENTF_RIGHTUP,  0],
-    "middle": [win32con.MOUSEEVENTF_MIDDLEDOWN, win32con.MOUSEEVENTF_MIDDLEUP, 0],
-    # XBUTTON1 = 1
-    "X1"    : [win32con.MOUSEEVENTF_XDOWN,      win32con.MOUSEEVENTF_XUP,      1],
-    # XBUTTON2 = 2
-    "X2"    : [win32con.MOUSEEVENTF_XDOWN,      win32con.MOUSEEVENTF_XUP,      2],
-    }
+if sys.platform == 'win32':
+    Mouse_buttons = { 
+        "left"  : [win32con.MOUSEEVENTF_LEFTDOWN,   win32con.MOUSEEVENTF_LEFTUP,   0],
+        "right" : [win32con.MOUSEEVENTF_RIGHTDOWN,  win32con.MOUSEEVENTF_RIGHTUP,  0],
+        "middle": [win32con.MOUSEEVENTF_MIDDLEDOWN, win32con.MOUSEEVENTF_MIDDLEUP, 0],
+        # XBUTTON1 = 1
+        "X1"    : [win32con.MOUSEEVENTF_XDOWN,      win32con.MOUSEEVENTF_XUP,      1],
+        # XBUTTON2 = 2
+        "X2"    : [win32con.MOUSEEVENTF_XDOWN,      win32con.MOUSEEVENTF_XUP,      2],
+        }
+else:
+    Mouse_buttons = {}
 
 def mouse_button_event(button, releasing=False):
     try:
@@ -132,25 +132,32 @@ def do_flush(functional_context, buffer):
 
 dragon_prefix = ""
 
-def convert_keys(keys):
-    # Roughly, {<keyname>_<count>}'s -> {<keyname> <count>}:
-    #   (is somewhat generous about what counts as a key name)
-    #
-    # Because we can't be sure of the current code page, treat all non-ASCII
-    # characters as potential accented letters for now.
-    keys = re.sub(r"""(?x)
+# Roughly, {<keyname>_<count>}'s -> {<keyname> <count>}:
+#   (is somewhat generous about what counts as a key name)
+#
+# Because we can't be sure of the current code page, treat all non-ASCII
+# characters as potential accented letters for now.
+key_count_pattern = re.compile(r"""(?x)
                       \{ ( (?: [a-zA-Z\x80-\xff]+ \+ )*
                            (?:[^}]|[-a-zA-Z0-9/*+.\x80-\xff]+) )
                       [ _]
-                      (\d+) \}""", r'{\1 \2}', keys)
+                      (\d+) \}""")
 
-    # prefix with current language appropriate version of {shift}
-    # to prevent doubling/dropping bug:
+def convert_key_names(keys):
+    if '{' not in keys:
+        return keys
+    return key_count_pattern.sub(r'{\1 \2}', keys)
+
+# prefix with current language appropriate version of {shift}
+# to prevent doubling/dropping bug:
+def shift_prefix():
     shift = name_for_shift()
     if shift:
-        keys = "{" + shift + "}" + keys
+        return "{" + shift + "}"
+    return ""
 
-    return keys
+def convert_keys(keys):
+    return shift_prefix() + convert_key_names(keys)
 
 def name_for_shift():
     if Language == "enx":
@@ -261,49 +268,69 @@ def call_Unimacro(argumentString):
 ## EvalTemplate built-in function:
 ##
 
-def eval_template(template, *arguments):
-    variables = {}
-
-    waiting = list(arguments)
-    def get_argument():
-        if len(waiting) == 0:
-            raise VocolaRuntimeError(
-                "insufficient number of arguments passed to Eval[Template]")
-        return waiting.pop(0)
-
-    def get_variable(value):
-        argument_number = len(arguments)-len(waiting)
-        name = "v" + str(argument_number)
-        variables[name] = value
-        return name
-
-    # is string the canonical representation of a long?
-    def isCanonicalNumber(string):
-        try:
-            return str(long(string)) == string
-        except ValueError:
-            return 0
+# A template is compiled once into the Python expression to evaluate,
+# with the descriptors replaced by variables v1, v2, ..., the kinds of
+# these descriptors ('s', 'i' or 'a') and the code of the expression
+# (None if it does not compile, the error is reported at evaluation):
+compiled_templates = {}
+max_compiled_templates = 1000
 
+def compile_template(template):
+    try:
+        return compiled_templates[template]
+    except KeyError:
+        pass
+    kinds = []
     def handle_descriptor(m):
         descriptor = m.group()
         if descriptor == "%%":
             return "%"
-        elif descriptor == "%s":
-            return get_variable(str(get_argument()))
-        elif descriptor == "%i":
-            return get_variable(to_long(get_argument()))
-        elif descriptor == "%a":
-            a = get_argument()
-            if isCanonicalNumber(a):
-                return get_variable(long(a))
-            else:
-                return get_variable(str(a))
+        elif descriptor in ("%s", "%i", "%a"):
+            kinds.append(descriptor[1])
+            return "v" + str(len(kinds))
         else:
             return descriptor
 
     expression = re.sub(r'%.', handle_descriptor, template)
     try:
-        return eval('str(' + expression + ')', variables.copy())
+        code = compile('str(' + expression + ')', '<string>', 'eval')
+    except Exception:
+        code = None
+    if len(compiled_templates) >= max_compiled_templates:
+        compiled_templates.clear()
+    compiled = compiled_templates[template] = (expression, kinds, code)
+    return compiled
+
+# is string the canonical representation of a long?
+def isCanonicalNumber(string):
+    try:
+        return str(long(string)) == string
+    except ValueError:
+        return 0
+
+def eval_template(template, *arguments):
+    expression, kinds, code = compile_template(template)
+
+    variables = {}
+    for i, kind in enumerate(kinds):
+        if i >= len(arguments):
+            raise VocolaRuntimeError(
+                "insufficient number of arguments passed to Eval[Template]")
+        a = arguments[i]
+        if kind == "s":
+            value = str(a)
+        elif kind == "i":
+            value = to_long(a)
+        elif isCanonicalNumber(a):
+            value = long(a)
+        else:
+            value = str(a)
+        variables["v" + str(i+1)] = value
+
+    try:
+        if code is None:
+            return eval('str(' + expression + ')', variables.copy())
+        return eval(code, variables.copy())
     except VocolaRuntimeAbort:
         raise
     except Exception, e:
@@ -8,6 +8,11 @@
 #   This module contains the Python code to convert the textual represenation
 #   of a command and control grammar in the standard SAPI CFG binary format.
 #
+# October 2026
+#   - the scanner matches whitespace and tokens with compiled regular expressions
+#     (reToken), instead of walking the text character by character
+#   - packGrammar writes into one preallocated buffer (struct.pack_into)
+#
 # April 1, 2000
 #   - we now throw an exception if there is a bad parse instead of just
 #     printing the error
@@ -50,11 +55,22 @@
 # 
 ########################################################################
 import six
-from struct import pack
+import struct
 import re, sys, os, os.path, traceback
 import utilsqh ## convertToBinary
 
 reAlphaNumeric = re.compile('\w+$')
+
+# the lexical scanner matches whitespace and tokens with these expressions:
+# (word characters are letters, digits and characters with ord >= 192, see isCharOrDigit)
+reWhiteSpace = re.compile(r'[ \t\n\r\x0b\x0c]*')
+tokenPattern = r'''(?P<ws>[ \t\n\r\x0b\x0c]*)(?:(?P<punct>[()\[\]|+=;\x00])|"(?P<dqword>[^"]*)"|'(?P<sqword>[^']*)'|<(?P<rule>[^>]*)>|\{(?P<list>[^}]*)\}|(?P<word>[A-Za-z0-9%s]+))'''
+reToken = re.compile(tokenPattern % '\xc0-\xff')
+reTokenUnicode = re.compile(six.text_type(tokenPattern) % u'\u00c0-\uffff', re.UNICODE)
+lexicalErrors = {'"': "expecting closing quote in word name",
+                 "'": "expecting closing quote in word name",
+                 '<': "expecting closing angle bracket in rule name",
+                 '{': "expecting closing brace in list name"}
 #
 # This is the lexical scanner.
 #
@@ -172,6 +188,11 @@ class GramScanner(object):
             self.text = copy.copy(text)
             if self.text[-1] != '\0':
                 self.text.append('\0')
+            # tabs and newlines after the first line are scanned as spaces:
+            for i in range(1, len(self.text)):
+                line = self.text[i]
+                if '\t' in line or '\n' in line:
+                    self.text[i] = line.replace('\t', ' ').replace('\n', ' ')
         else:
             self.text = ['\0']
         self.lastWhiteSpace = ""  # for gramscannerreverse
@@ -207,25 +228,21 @@ class GramScanner(object):
         ch = self.char
         oldPos = ch
         oldLine = self.line
+        text = self.text
         while 1:
-            ln = self.text[self.line]
-            lnLen = len(ln)
-            while ch < lnLen and ln[ch] in string.whitespace:
-                ch = ch + 1
-            if ch < lnLen and ln[ch] != '#':
+            ln = text[self.line]
+            ch = reWhiteSpace.match(ln, ch).end()
+            if ch < len(ln) and ln[ch] != '#':
                 break
             self.line = self.line + 1
-            self.text[self.line] = string.replace(self.text[self.line],'\t',' ')
-            self.text[self.line] = string.replace(self.text[self.line],'\n',' ')
             ch = 0
         self.char = ch
         if self.line == oldLine:
             self.lastWhiteSpace = ln[oldPos:ch]
         else:
-            L = [self.text[oldLine][oldPos:]]
-            for l in range(oldLine+1, self.line):
-                L.append(self.text[l])
-            L.append(self.text[self.line][:ch])
+            L = [text[oldLine][oldPos:]]
+            L.extend(text[oldLine+1:self.line])
+            L.append(ln[:ch])
             self.lastWhiteSpace = '\n'.join(L)
                 
 
@@ -239,6 +256,8 @@ class GramScanner(object):
         Note "exorted" and "imported" and list names and rule names must have token 'word'
         Grammar words can have dqword or sqword too. (dqword and sqword added by QH, july 2012)
         
+        The tokens are matched with the compiled regular expressions reToken and
+        reTokenUnicode (for unicode input).
         """    
     
         if self.token == '\0':
@@ -246,67 +265,35 @@ class GramScanner(object):
         
         self.value = None
 
-        self.skipWhiteSpace()  # now leaves self.lastWhiteSpace
-        ch = self.char
         ln = self.text[self.line]
-        lnLen = len(ln)
-
-        self.start = ch
-        
-        if ln[ch] in ['(', ')', '[', ']', '|', '+', '=', ';', '\0']:
+        if type(ln) == six.text_type:
+            reTok = reTokenUnicode
+        else:
+            reTok = reToken
+        # fast path: whitespace and token on the current line in one match
+        m = reTok.match(ln, self.char)
+        if m is None:
+            # comment, end of line or error:
+            self.skipWhiteSpace()  # now leaves self.lastWhiteSpace
+            ch = self.char
+            ln = self.text[self.line]
+            self.start = ch
+            if type(ln) == six.text_type:
+                m = reTokenUnicode.match(ln, ch)
+            else:
+                m = reToken.match(ln, ch)
+            if m is None:
+                raise LexicalError( lexicalErrors.get(ln[ch], "unknown character found"), self)
+        else:
+            self.lastWhiteSpace = m.group('ws')
+            ch = self.start = m.end('ws')
+        token = m.lastgroup
+        if token == 'punct':
             self.token = ln[ch]
-            ch = ch + 1
-
-        elif ln[ch] == '"':
-            self.token = 'dqword'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '"':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError( "expecting closing quote in word name", self)
-            self.value = ln[self.start+1:ch]
-            ch = ch + 1
-        
-        elif ln[ch] == "'":
-            self.token = 'sqword'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != "'":
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError( "expecting closing quote in word name", self)
-            self.value = ln[self.start+1:ch]
-            ch = ch + 1
-        
-        elif ln[ch] == '<':
-            self.token = 'rule'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '>':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError( "expecting closing angle bracket in rule name", self)
-            self.value = ln[self.start+1:ch]
-            ch = ch + 1
-
-        elif ln[ch] == '{':
-            self.token = 'list'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '}':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError( "expecting closing brace in list name", self)
-            self.value = ln[self.start+1:ch]
-            ch = ch + 1
-
-        elif isCharOrDigit(ln[ch]):
-            self.token = 'word'
-            while ch < lnLen and isCharOrDigit(ln[ch]):
-                ch = ch + 1
-            self.value = ln[self.start:ch]
-
         else:
-            raise LexicalError( "unknown character found", self)
-
-        self.char = ch
+            self.token = token
+            self.value = m.group(token)
+        self.char = m.end()
 
 ## generator function, scanning the tokens and whitespace of a gramspec:
 ## this class can scan a grammar, return the tokens in a generator function
@@ -694,75 +681,125 @@ class GramParser(object):
 # The fifth chunk contains the details of the elements which make up each
 # defined rule.
 #
+# The binary is written with struct.pack_into into one preallocated buffer,
+# so packing time is linear in the size of the grammar.
+#
 
-def packGrammar(parseObj):
-    output = ""
+headerStruct = struct.Struct("LL")
+elementStruct = struct.Struct("HHL")
+elemType = { 'start':1, 'end':2, 'word':3, 'rule':4, 'list':6 }
 
+def packGrammar(parseObj):
     # header:
     #   DWORD dwType  = 0
     #   DWORD dwFlags = 0
-    output = output + pack("LL", 0, 0)
-
-    # various chunks
+    # followed by the various chunks
+    chunks = []
     if len(parseObj.exportRules):
-        output = output + packGrammarChunk(4, parseObj.exportRules)
+        chunks.append(_chunkWriter(4, parseObj.exportRules))
     if len(parseObj.importRules):
-        output = output + packGrammarChunk(5, parseObj.importRules)
+        chunks.append(_chunkWriter(5, parseObj.importRules))
     if len(parseObj.knownLists):
-        output = output + packGrammarChunk(6, parseObj.knownLists)
+        chunks.append(_chunkWriter(6, parseObj.knownLists))
     if len(parseObj.knownWords):
-        output = output + packGrammarChunk(2, parseObj.knownWords)
+        chunks.append(_chunkWriter(2, parseObj.knownWords))
     if len(parseObj.ruleDefines):
-        output = output + packGrammarRules(3, parseObj.knownRules, parseObj.ruleDefines)
-    return output
+        chunks.append(_rulesWriter(3, parseObj.knownRules, parseObj.ruleDefines))
+
+    totalSize = headerStruct.size + sum([size for size, writer in chunks])
+    buf = bytearray(totalSize)
+    headerStruct.pack_into(buf, 0, 0, 0)
+    offset = headerStruct.size
+    for size, writer in chunks:
+        writer(buf, offset)
+        offset += size
+    return str(buf)
 
 
 def packGrammarChunk(type,dict):
-    output = ""
-    totalLen = 0
+    size, writer = _chunkWriter(type, dict)
+    buf = bytearray(size)
+    writer(buf, 0)
+    return str(buf)
+
+
+def packGrammarRules(type,names,dict):
+    size, writer = _rulesWriter(type, names, dict)
+    buf = bytearray(size)
+    writer(buf, 0)
+    return str(buf)
 
-    for word in dict.keys():
+
+def _chunkWriter(type, dict):
+    """return the size of a names chunk and a function that writes it into a buffer
+    """
+    entries = []
+    totalLen = 0
+    bufLen = headerStruct.size
+    for word, num in dict.items():
         # chunk data entry
         #   DWORD dwSize = number of bytes in entry
         #   DWORD dwNum  = ID number for this rule/word
         #   DWORD szName = name of rule/word, zero-term'd and padded to dword
         paddedLen = ( len(word) + 4 ) & 0xFFFC
-        output = output + pack( "LL%ds" % paddedLen, paddedLen+8, dict[word], word )
+        entryStruct = _entryStruct(paddedLen)
+        entries.append( (entryStruct, paddedLen+8, num, word) )
         totalLen = totalLen + paddedLen+8
-
-    # chunk header
-    #   DWORD dwChunkID = type
-    #   DWORD dwChunkSize = number of bytes in chunk not including this header
-    return pack( "LL", type, totalLen ) + output
-
-
-def packGrammarRules(type,names,dict):
-    output = ""
+        bufLen = bufLen + entryStruct.size
+
+    def writer(buf, offset):
+        # chunk header
+        #   DWORD dwChunkID = type
+        #   DWORD dwChunkSize = number of bytes in chunk not including this header
+        headerStruct.pack_into(buf, offset, type, totalLen)
+        offset += headerStruct.size
+        for entryStruct, entryLen, num, word in entries:
+            entryStruct.pack_into(buf, offset, entryLen, num, word)
+            offset += entryStruct.size
+    return bufLen, writer
+
+
+def _rulesWriter(type, names, dict):
+    """return the size of the rules chunk and a function that writes it into a buffer
+    """
+    rules = dict.items()
     totalLen = 0
-    elemType = { 'start':1, 'end':2, 'word':3, 'rule':4, 'list':6 }
-
-    for word in dict.keys():
-        ruleDef = ""
-        ruleLen = 0
-
-        for element in dict[word]:
-            # repeated element:
-            #   WORD wType    = element type
-            #   WORD wProb    = 0
-            #   DWORD dwValue = element value
-            ruleDef = ruleDef + pack( "HHL", elemType[element[0]], 0, element[1] )
-            ruleLen = ruleLen + 8
-        
-        # rule definition:
-        #   DWORD dwSize = number of bytes in rule definition
-        #   DWORD dwnum  = ID number of rule
-        output = output + pack( "LL", ruleLen+8, names[word] ) + ruleDef
+    bufLen = headerStruct.size
+    for word, definition in rules:
+        ruleLen = 8 * len(definition)
         totalLen = totalLen + ruleLen+8
-
-    # chunk header:
-    #   DWORD dwChunkID = type
-    #   DWORD dwChunkSize = number of bytes in chunk not including this header
-    return pack( "LL", type, totalLen ) + output
+        bufLen = bufLen + headerStruct.size + elementStruct.size * len(definition)
+
+    def writer(buf, offset):
+        # chunk header:
+        #   DWORD dwChunkID = type
+        #   DWORD dwChunkSize = number of bytes in chunk not including this header
+        headerStruct.pack_into(buf, offset, type, totalLen)
+        offset += headerStruct.size
+        for word, definition in rules:
+            # rule definition:
+            #   DWORD dwSize = number of bytes in rule definition
+            #   DWORD dwnum  = ID number of rule
+            headerStruct.pack_into(buf, offset, 8 * len(definition) + 8, names[word])
+            offset += headerStruct.size
+            for element in definition:
+                # repeated element:
+                #   WORD wType    = element type
+                #   WORD wProb    = 0
+                #   DWORD dwValue = element value
+                elementStruct.pack_into(buf, offset, elemType[element[0]], 0, element[1])
+                offset += elementStruct.size
+    return bufLen, writer
+
+_entryStructs = {}
+def _entryStruct(paddedLen):
+    """struct for a chunk entry, cached per padded name length
+    """
+    try:
+        return _entryStructs[paddedLen]
+    except KeyError:
+        entryStruct = _entryStructs[paddedLen] = struct.Struct("LL%ds" % paddedLen)
+        return entryStruct
 
 #
 # This is a routine which was included for testing but can also be used to 
@@ -895,6 +932,37 @@ def _test():
     doctest.master = None
     return  doctest.testmod(gramparser)
             
+def makeBenchmarkGrammar(nWords):
+    """make a large grammar, like the ones generated by Vocola, with nWords words
+    """
+    lines = ['<start> exported = <command> | <command> {list} | <spelling>;']
+    for i in range(0, nWords, 100):
+        words = ' | '.join(['word%s "word %s"'% (j, j) for j in range(i, min(i+100, nWords), 2)])
+        lines.append('<command%s> = %s;'% (i, words))
+    lines.append('<command> = %s;'% ' | '.join(['<command%s>'% i for i in range(0, nWords, 100)]))
+    lines.append('<spelling> exported = (alpha | bravo | charlie | <command>)+;')
+    return lines
+
+def _benchmark(sizes=(1000, 2000, 4000, 8000, 16000), repeat=5):
+    """time packGrammar on generated grammars, time per word should stay constant
+    """
+    import time
+    print 'words   bytes      msec   usec/word'
+    for nWords in sizes:
+        parser = GramParser(makeBenchmarkGrammar(nWords))
+        parser.doParse()
+        best = None
+        for i in range(repeat):
+            t0 = time.clock()
+            gramBin = packGrammar(parser)
+            elapsed = time.clock() - t0
+            if best is None or elapsed < best:
+                best = elapsed
+        print '%5s %8s %9.2f %11.3f'% (nWords, len(gramBin), best*1000, best*1e6/nWords)
+            
 if __name__ == "__main__":
-    _test()
+    if sys.argv[1:] == ['bench']:
+        _benchmark()
+    else:
+        _test()
 
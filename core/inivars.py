@@ -4,8 +4,10 @@ from __future__ import unicode_literals
 
 """
 import six
-import win32api, types
+import types
 import os, os.path, sys, re, copy, string
+if sys.platform == 'win32':
+    import win32api
 import utilsqh
 from utilsqh import path, peek_ahead
 import locale
@@ -44,6 +46,9 @@ reQuotes = re.compile(ur'[\'"]')
 reListValueSplit = re.compile(ur'[\n;]', re.M)
 reWhiteSpace = re.compile(ur'\s+')
 
+# for the lazy mode, find all section and key lines of a file in one pass:
+reIndexLine = re.compile(ur'^(?:\[\b([- \.\w]+)][^\S\n]*$|\b([- \.\w]+)[^\S\n]*=(.*)$)', re.L|re.M)
+
 reDoubleQuotes = re.compile(ur'^"([^"]*)"$', re.M)
 reSingleQuotes = re.compile(ur"^'([^']*)'$", re.M)
 
@@ -373,8 +378,25 @@ def lensort(a, b):
     else:
         return -cmp(la, lb)
 
+class IniRawValue(object):
+    """position of a not yet parsed value in the text of the inifile (lazy mode)
+    """
+    __slots__ = ('start', 'end')
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+
 class IniSection(UserDict):
-    """represents a section of an inivars instance"""
+    """represents a section of an inivars instance
+    
+    in lazy mode values can be IniRawValue instances, these are parsed when
+    they are accessed.
+    
+    _memo holds the results of getList, getDict and getInt, per key
+
+    _dirty is set when the section changes, _writeCache holds the formatted
+    lines of the section (see IniVars._getSectionLines)
+    """
 
     def __init__(self, parent):
         """init with ignore case if given in inivars
@@ -383,8 +405,55 @@ class IniSection(UserDict):
         self._parent = parent
         self._returnStrings = None
         self._SKIgnorecase = parent._SKIgnorecase
+        self._memo = {}
+        self._dirty = True
+        self._writeCache = {}
         UserDict.__init__(self)
 
+    def _resolveAll(self):
+        """parse all values that are still IniRawValue instances
+        """
+        data = self.data
+        for k, v in data.items():
+            if type(v) == IniRawValue:
+                data[k] = self._parent._resolveRawValue(v)
+
+    def items(self):
+        self._resolveAll()
+        return self.data.items()
+    def values(self):
+        self._resolveAll()
+        return self.data.values()
+    def iteritems(self):
+        self._resolveAll()
+        return self.data.iteritems()
+    def itervalues(self):
+        self._resolveAll()
+        return self.data.itervalues()
+    def __repr__(self):
+        self._resolveAll()
+        return repr(self.data)
+    def __cmp__(self, other):
+        self._resolveAll()
+        if isinstance(other, IniSection):
+            other._resolveAll()
+        return UserDict.__cmp__(self, other)
+
+    def getMemo(self, kind, key, value):
+        """return the memoized getList/getDict/getInt result for key, or None
+
+        the result is only valid if value is still the (same) value of key
+        """
+        try:
+            memoValue, result = self._memo[(kind, key)]
+        except KeyError:
+            return
+        if memoValue is value:
+            return result
+
+    def setMemo(self, kind, key, value, result):
+        self._memo[(kind, key)] = (value, result)
+
     def __getitem__(self, key):
         '''double underscore means internal value'''
         if type(key)  == six.binary_type:
@@ -402,7 +471,9 @@ class IniSection(UserDict):
                 key = key.lower()
             try:
                 value = UserDict.__getitem__(self, key)
-                if type(value) == six.binary_type:
+                if type(value) == IniRawValue:
+                    value = self.data[key] = self._parent._resolveRawValue(value)
+                elif type(value) == six.binary_type:
                     print('warning inivars, value binary_type: %s (key: %s)'% (value, key))
                     value = utilsqh.convertToUnicode(value)
                 return value
@@ -424,6 +495,9 @@ class IniSection(UserDict):
             else:
                 if self._SKIgnorecase:
                     key = key.lower()
+                if self._memo:
+                    self._memo.clear()
+                self._dirty = True
                 UserDict.__setitem__(self, key, value)
         else:
             raise TypeError('inivars, IniSection __setitem__ expects str for key "%s", not: %s'% (key, type(key)))
@@ -443,6 +517,9 @@ class IniSection(UserDict):
             else:
                 if self._SKIgnorecase:
                     key = key.lower()
+                if self._memo:
+                    self._memo.clear()
+                self._dirty = True
                 try:
                     UserDict.__delitem__(self, key)
                 except KeyError:
@@ -460,6 +537,12 @@ class IniVars(UserDict):
     with other file types.
 
     File doesn't have to exist before.
+    version 9:  write only formats sections that changed since the previous write,
+                and writes the file atomically (october 2026)
+                option lazy=1: only sections and keys are indexed when reading,
+                values are parsed when they are asked for. The results of
+                getList, getDict and getInt are memoized per key (october 2026)
+
     version 8:  all go to unicode, and subclass UserDict (november 2018)
 
     version 7:  quoting is allowed when spaces or special characters
@@ -564,6 +647,7 @@ u'v'
 [u'k2', u'k']
     """
     _SKIgnorecase = None
+    _lazy = None
     
     def __init__(self, File, **kw):
         """init from valid files, raise error if invalid file
@@ -579,6 +663,7 @@ u'v'
         self._changed = 0
         self._maxLength = 60
         self._SKIgnorecase = kw.get('SKIgnorecase', None)
+        self._lazy = kw.get('lazy', None)
         self._codingscheme = None
         self._bom = None
         self._rawtext = ""
@@ -759,6 +844,9 @@ u'v'
         #     print "file heeft een bommark: %s"% repr(self._bom)
         if self._codingscheme is None:
             raise IniError("Could not find correct encoding for this file: %s"% file)
+        if self._lazy and not self._repairErrors:
+            self._indexIni(file)
+            return
         rawList = self._rawtext.split('\n')
         for line in rawList:
             line = line.rstrip()
@@ -834,6 +922,80 @@ u'v'
             for k in section:
                section[k] = listToString(section[k])
 
+    def _indexIni(self, file):
+        """index sections and keys of self._rawtext in one pass (lazy mode)
+
+        the values are stored as IniRawValue instances, which are converted
+        (like in _readIni) by _resolveRawValue when they are accessed.
+        Errors are the same as with _readIni (without repairErrors).
+        """
+        global lineNum
+        text = self._rawtext
+        section = None
+        sectionName = ''
+        sectionNamePos = {}
+        rawValue = None
+        prevEnd = 0
+        for m in reIndexLine.finditer(text):
+            if rawValue is None:
+                self._checkIndexGap(prevEnd, m.start(), section, sectionName)
+            else:
+                rawValue.end = m.start() - 1
+                rawValue = None
+            prevEnd = m.end()
+            if m.group(1) is not None:
+                sectionName = m.group(1).strip()
+                if sectionName in self:
+                    lineNum = self._lineNumber(m.start())
+                    raise IniError('Duplicate section "%s" on line %s and on line %s\n\t(please correct in file "%s")'% (
+                        sectionName, self._lineNumber(sectionNamePos[sectionName]), lineNum, file))
+                self[sectionName] = IniSection(parent = self)
+                section = self[sectionName]
+                sectionNamePos[sectionName] = m.start()
+                continue
+            keyName = m.group(2).strip()
+            if section is None:
+                lineNum = self._lineNumber(m.start())
+                raise IniError('no section defined yet')
+            if keyName in section:
+                lineNum = self._lineNumber(m.start())
+                raise IniError('Duplicate keyname "%s" in section %s on line %s\n\t(please correct in file "%s")'% (
+                    keyName, sectionName, lineNum, file))
+            rawValue = IniRawValue(m.start(3))
+            section[keyName] = rawValue
+        if rawValue is None:
+            self._checkIndexGap(prevEnd, len(text), section, sectionName)
+        else:
+            rawValue.end = len(text)
+        lineNum = 0
+
+    def _checkIndexGap(self, start, end, section, sectionName):
+        """raise IniError if text between sections and keys is not empty
+        """
+        global lineNum
+        gap = self._rawtext[start:end]
+        if not gap.strip():
+            return
+        lineNum = self._lineNumber(start + len(gap) - len(gap.lstrip()))
+        if section is None:
+            raise IniError('no key or section found yet')
+        raise IniError('No key found in section "%s" on line %s\n\t(please correct in file "%s")'% (
+            sectionName, lineNum, self._file))
+
+    def _lineNumber(self, pos):
+        """line number of position pos in self._rawtext
+        """
+        return self._rawtext.count('\n', 0, pos) + 1
+
+    def _resolveRawValue(self, rawValue):
+        """return the value of an IniRawValue, as _readIni would have produced
+        """
+        lines = self._rawtext[rawValue.start:rawValue.end].split('\n')
+        lines[0] = lines[0].rstrip()
+        for i in range(1, len(lines)):
+            lines[i] = lines[i].strip()
+        return listToString(lines)
+
     def writeIfChanged(self, file=None):
         if self._changed:
             self.write(file=file)
@@ -851,131 +1013,19 @@ u'v'
             raise IniError, 'invalid extension for writing to file: %s'% file
 
     def _writeIni(self, file):
-        """writes to file of type ini"""
+        """writes to file of type ini
+
+        the lines of sections that did not change since the previous write
+        are taken from the write cache of the section (see _getSectionLines).
+        The file is written atomically (temporary file, then rename).
+        """
         L = []
         sections = self.get()
         sections.sort()
         hasTrailingNewline = 1   # no newline for section
         for s in sections:
-            if s == 'cache next date':
-                pass
-            hadTrailingNewline = hasTrailingNewline
-            hasTrailingNewline = 0
-            if  not hadTrailingNewline:
-                L.append('')    # prevent extra newlines at top or after multiline key
-            L.append('[%s]'% s)
-            keys = self.get(s)
-            #  key char has '-', for sitegen:
-            keyhashyphen = 0
-            for k in keys:
-                if type(k) == six.binary_type:
-                    k = utilsqh.convertToUnicode(k)
-                if k.find('-') > 0:
-                    keyhashyphen = 1
-                    break
-            if keyhashyphen:
-               # special case for sitegen:
-                keys = sortHyphenKeys(keys)
-            else:
-                keys.sort()
-
-            for k in keys:
-                hadTrailingNewline = hasTrailingNewline
-                hasTrailingNewline = 0
-                if type(k) == six.binary_type:
-                    k = utilsqh.convertToUnicode(k)
-                v = self[s][k]
-                if type(v) == types.IntType:
-                    L.append(u'%s = %s' % (k, v))
-                elif type(v) == types.FloatType:
-                    L.append(u'%s = %s' % (k, v))
-                elif type(v) == types.BooleanType:
-                    L.append(u'%s = %s' % (k, str(v)))
-                elif not v:
-                    # print 'k: %s(%s)'% (k, type(k))
-                    L.append(u'%s =' % k)
-                        
-                elif type(v) == types.ListType or type(v) == types.TupleType:
-                    valueList = map(quoteSpecialList, v)
-                    startString = u'%s = '% k
-                    length = len(startString)
-                    listToWrite = []
-                    for v in valueList:
-                        if listToWrite and length + len(v) + 2 > self._maxLength:
-                            L.append(u'%s%s' % (startString, '; '.join(listToWrite)))
-                            listToWrite = [v]
-                            startString = ' '*len(startString)
-                            length = len(startString) + len(v)
-                        else:
-                            listToWrite.append(v)
-                            length += len(v) + 2
-                    if length > 72:
-                        hasTrailingNewline = 1
-                    L.append(u'%s%s' % (startString, '; '.join(listToWrite)))
-                    L.append('')
-                elif type(v) == types.DictType:
-                    inverse = {}
-                    for K, V in v.items():
-                        if type(V) == six.binary_type:
-                            V = utilsqh.convertToUnicode(V)
-                            vv = quoteSpecialDict(V)                            
-                        elif type(V) == six.text_type:
-                            vv = quoteSpecialDict(V)                            
-                        elif type(V) == types.ListType or type(V) == types.TupleType:
-                            vv = ', '.join(map(quoteSpecialDict, V))
-                        elif V is None:
-                            vv = None
-                        if vv in inverse:
-                            inverse[vv].append(K)
-                        else:
-                            inverse[vv] = [K]
-                    startString = u'%s = '% k
-                    length = len(startString)
-                    if not inverse:
-                        L.append(u'%s' % startString)
-                    else:
-                        if None in inverse:
-                            L.append(u'%s%s' % (startString, ', '.join(inverse[None])))
-                            del inverse[None]
-                            startString = ' '*len(startString)
-                        if inverse:
-                            for K, V in inverse.items():
-##                                print 'writing back value: |%s|, startString: |%s|, keys: |%s|'% \
-##                                      (K, startString, V)
-                                L.append(u'%s%s: %s' % (startString, ', '.join(V), K))
-                                startString = ' '*len(startString)
-                    hasTrailingNewline = 1
-                    L.append('')
-                else:
-                    if type(v) == six.binary_type:
-                        v = utilsqh.convertToUnicode(v)
-                    if type(v) != six.text_type:
-                        v = unicode(v)
-                    v = v.strip()
-                    if v.find('\n') >= 0:
-                        hasTrailingNewline = 1
-                        V = v.split('\n')
-                        if not hadTrailingNewline:
-                            L.append('')    # 1 extra newline
-                        L.append(u'%s =' % k)
-                        spacing = ' '*4
-                        for li in V:
-                            if li:
-                                L.append(u'%s%s' % (spacing, li))
-                            else:
-                                L.append('')
-                        L.append('')
-                    elif len(k) + len(v) > 72:
-                        if not hasTrailingNewline:
-                            L.append('')
-                        L.append(u'%s = %s' % (k, v))
-                        L.append('')
-                        hasTrailingNewline = 1
-                    else:
-                        L.append('%s = %s' % (k, v))
-
-            if not hadTrailingNewline:
-                L.append('')
+            sectionLines, hasTrailingNewline = self._getSectionLines(s, hasTrailingNewline)
+            L.extend(sectionLines)
 ##        if path(self._file).isfile():
 ##            old = open(self._file).read()
 ##        else:
@@ -987,9 +1037,160 @@ u'v'
 ####            print 'no changes'
 ##        else:
 ####            self.saveOldInifile()
-        readwritefile.writeAnything(file, self._codingscheme, self._bom, new)
+        readwritefile.writeAnything(file, self._codingscheme, self._bom, new, atomic=True)
         pass
 
+    def _getSectionLines(self, s, hasTrailingNewline):
+        """return the lines of section s and the new hasTrailingNewline state
+
+        results are cached in the section, until the section is changed (dirty).
+        Sections with list or dict values are not cached, as these values can
+        be changed in place.
+        """
+        section = self[s]
+        cache = section._writeCache
+        if section._dirty:
+            cache.clear()
+            section._dirty = False
+        cacheKey = (s, hasTrailingNewline)
+        try:
+            return cache[cacheKey]
+        except KeyError:
+            pass
+        result = self._sectionLines(s, hasTrailingNewline)
+        for v in section.data.itervalues():
+            if type(v) in (types.ListType, types.TupleType, types.DictType):
+                break
+        else:
+            cache[cacheKey] = result
+        return result
+
+    def _sectionLines(self, s, hasTrailingNewline):
+        """format the lines of section s, depending on the previous hasTrailingNewline state
+        """
+        L = []
+        if s == 'cache next date':
+            pass
+        hadTrailingNewline = hasTrailingNewline
+        hasTrailingNewline = 0
+        if  not hadTrailingNewline:
+            L.append('')    # prevent extra newlines at top or after multiline key
+        L.append('[%s]'% s)
+        keys = self.get(s)
+        #  key char has '-', for sitegen:
+        keyhashyphen = 0
+        for k in keys:
+            if type(k) == six.binary_type:
+                k = utilsqh.convertToUnicode(k)
+            if k.find('-') > 0:
+                keyhashyphen = 1
+                break
+        if keyhashyphen:
+           # special case for sitegen:
+            keys = sortHyphenKeys(keys)
+        else:
+            keys.sort()
+
+        for k in keys:
+            hadTrailingNewline = hasTrailingNewline
+            hasTrailingNewline = 0
+            if type(k) == six.binary_type:
+                k = utilsqh.convertToUnicode(k)
+            v = self[s][k]
+            if type(v) == types.IntType:
+                L.append(u'%s = %s' % (k, v))
+            elif type(v) == types.FloatType:
+                L.append(u'%s = %s' % (k, v))
+            elif type(v) == types.BooleanType:
+                L.append(u'%s = %s' % (k, str(v)))
+            elif not v:
+                # print 'k: %s(%s)'% (k, type(k))
+                L.append(u'%s =' % k)
+                    
+            elif type(v) == types.ListType or type(v) == types.TupleType:
+                valueList = map(quoteSpecialList, v)
+                startString = u'%s = '% k
+                length = len(startString)
+                listToWrite = []
+                for v in valueList:
+                    if listToWrite and length + len(v) + 2 > self._maxLength:
+                        L.append(u'%s%s' % (startString, '; '.join(listToWrite)))
+                        listToWrite = [v]
+                        startString = ' '*len(startString)
+                        length = len(startString) + len(v)
+                    else:
+                        listToWrite.append(v)
+                        length += len(v) + 2
+                if length > 72:
+                    hasTrailingNewline = 1
+                L.append(u'%s%s' % (startString, '; '.join(listToWrite)))
+                L.append('')
+            elif type(v) == types.DictType:
+                inverse = {}
+                for K, V in v.items():
+                    if type(V) == six.binary_type:
+                        V = utilsqh.convertToUnicode(V)
+                        vv = quoteSpecialDict(V)                            
+                    elif type(V) == six.text_type:
+                        vv = quoteSpecialDict(V)                            
+                    elif type(V) == types.ListType or type(V) == types.TupleType:
+                        vv = ', '.join(map(quoteSpecialDict, V))
+                    elif V is None:
+                        vv = None
+                    if vv in inverse:
+                        inverse[vv].append(K)
+                    else:
+                        inverse[vv] = [K]
+                startString = u'%s = '% k
+                length = len(startString)
+                if not inverse:
+                    L.append(u'%s' % startString)
+                else:
+                    if None in inverse:
+                        L.append(u'%s%s' % (startString, ', '.join(inverse[None])))
+                        del inverse[None]
+                        startString = ' '*len(startString)
+                    if inverse:
+                        for K, V in inverse.items():
+##                                print 'writing back value: |%s|, startString: |%s|, keys: |%s|'% \
+##                                      (K, startString, V)
+                            L.append(u'%s%s: %s' % (startString, ', '.join(V), K))
+                            startString = ' '*len(startString)
+                hasTrailingNewline = 1
+                L.append('')
+            else:
+                if type(v) == six.binary_type:
+                    v = utilsqh.convertToUnicode(v)
+                if type(v) != six.text_type:
+                    v = unicode(v)
+                v = v.strip()
+                if v.find('\n') >= 0:
+                    hasTrailingNewline = 1
+                    V = v.split('\n')
+                    if not hadTrailingNewline:
+                        L.append('')    # 1 extra newline
+                    L.append(u'%s =' % k)
+                    spacing = ' '*4
+                    for li in V:
+                        if li:
+                            L.append(u'%s%s' % (spacing, li))
+                        else:
+                            L.append('')
+                    L.append('')
+                elif len(k) + len(v) > 72:
+                    if not hasTrailingNewline:
+                        L.append('')
+                    L.append(u'%s = %s' % (k, v))
+                    L.append('')
+                    hasTrailingNewline = 1
+                else:
+                    L.append('%s = %s' % (k, v))
+
+        if not hadTrailingNewline:
+            L.append('')
+        return L, hasTrailingNewline
+
+
     def saveOldInifile(self):
         """make copy -1, ..., -9 for previous versions"""
         orgfile = self._file
@@ -1384,9 +1585,12 @@ u'v'
             return []
         if type(value) == types.ListType:
             return copy.copy(value)
-        else:
+        sectionObj = self[section]
+        L = sectionObj.getMemo('list', key, value)
+        if L is None:
             L = list(getIniList(value))
-        return L
+            sectionObj.setMemo('list', key, value, L)
+        return L[:]
 
     def getDict(self, section, key, default=None):
         """get a value and convert into a dict
@@ -1472,15 +1676,19 @@ u'v'
         elif type(value) == types.DictType:
             return copy.deepcopy(value)
         
-        D = {}
-        for listvalue in getIniList(value):
-            for k, v in getIniDict(listvalue):
-                if k in D:
-                    raise IniError('duplicate key |%s| in getDict: %s'%
-                                   (k, value))
-                D[k] = v
-            
-        return D
+        sectionObj = self[section]
+        D = sectionObj.getMemo('dict', key, value)
+        if D is None:
+            D = {}
+            for listvalue in getIniList(value):
+                for k, v in getIniDict(listvalue):
+                    if k in D:
+                        raise IniError('duplicate key |%s| in getDict: %s'%
+                                       (k, value))
+                    D[k] = v
+            sectionObj.setMemo('dict', key, value, D)
+        # copy, values can be lists:
+        return dict([(k, v[:] if type(v) == types.ListType else v) for (k, v) in D.iteritems()])
             
     def getInt(self, section, key, default=0):
         """get a value and convert into a int
@@ -1508,11 +1716,16 @@ u'v'
             i = utilsqh.convertToUnicode(i)
         if type(i) == six.text_type:
             if i:
-                try:
-                    return int(i)
-                except ValueError:
-                    raise IniError('ini method getInt, value not a valid integer: %s (section: %s, key: %s)'%
-                                   (section, key, i))
+                sectionObj = self[section]
+                result = sectionObj.getMemo('int', key, i)
+                if result is None:
+                    try:
+                        result = int(i)
+                    except ValueError:
+                        raise IniError('ini method getInt, value not a valid integer: %s (section: %s, key: %s)'%
+                                       (section, key, i))
+                    sectionObj.setMemo('int', key, i, result)
+                return result
             else:
                 return 0
         raise IniError('invalid type for getInt (probably intermediate set without write: %s)(section: %s, key: %s'%
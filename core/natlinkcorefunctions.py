@@ -28,7 +28,11 @@ Note: for extension with %NATLINK% etc. see natlinkstatus.py
 
 """ 
 import os, sys, re, copy
-from win32com.shell import shell, shellcon
+if sys.platform == 'win32':
+    from win32com.shell import shell, shellcon
+else:
+    # outside Windows only the ini file functions are available (eg for testing)
+    shell = shellcon = None
 # import win32api
 # for extended environment variables:
 reEnv = re.compile('(%[A-Z_]+%)', re.I)
@@ -408,6 +412,54 @@ def printAllEnvVariables():
     for k in sorted(recentEnv.keys()):
         print("%s\t%s"% (k, recentEnv[k]))
 
+# process-wide registry of parsed inifiles, used by InifileSection:
+# {normalized path: (stamp, IniVars instance)}
+sharedIniFiles = {}
+
+def getFileStamp(filename):
+    """return (mtime, size) of a file, None if the file does not exist
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+def getSharedIniVars(filename, stamp=None):
+    """return the IniVars instance of filename, shared by all callers
+
+    the file is only read again if its modification time or size changed
+    (stamp: the result of getFileStamp, if the caller already has it).
+    The shared instance must not be changed, change a copy (see InifileSection).
+    """
+    key = os.path.normcase(os.path.abspath(filename))
+    if stamp is None:
+        stamp = getFileStamp(filename)
+    try:
+        oldStamp, ini = sharedIniFiles[key]
+    except KeyError:
+        pass
+    else:
+        if oldStamp == stamp:
+            return ini
+    ini = IniVars(filename, lazy=1)
+    sharedIniFiles[key] = (stamp, ini)
+    return ini
+
+def writeSharedIniVars(ini):
+    """write a changed copy of a shared IniVars instance, and make it the shared
+    instance (with the new stamp of the file)
+    """
+    ini.write()
+    filename = ini.getFilename()
+    key = os.path.normcase(os.path.abspath(filename))
+    sharedIniFiles[key] = (getFileStamp(filename), ini)
+
+def clearSharedIniFiles():
+    """forget all shared inifiles, so they are read again
+    """
+    sharedIniFiles.clear()
+
 class InifileSection(object):
     """simulate a part of the registry through inifiles
     
@@ -420,6 +472,11 @@ class InifileSection(object):
         
         Only use for readonly or for one section if you want to rewrite data!!
         
+        The IniVars instance is shared between all instances for the same file
+        (see getSharedIniVars), and only read again when the file changed on disk.
+        A change is made in a copy for this instance (copy on write), that is
+        shared again when it is written.
+        
         methods:
         set(key, value): set a key=value entry in the section
         get(key, defaultValue=None): get the associated value with
@@ -436,19 +493,46 @@ class InifileSection(object):
         
         """
         self.section = section
-        self.ini = IniVars(filename) # want strings to be returned
+        self.filename = filename
+        self._own = None  # (stamp, IniVars) copy with changes that are not written
           
+    def _getIni(self, forChange=0):
+        """the IniVars instance of the file, for one method call
+
+        the shared instance (reread if the file changed), or the copy of this
+        instance if it has unwritten changes (and the file did not change).
+        With forChange, a copy is made (copy on write) if there is none.
+        """
+        stamp = getFileStamp(self.filename)
+        if self._own is not None:
+            if self._own[0] == stamp:
+                return self._own[1]
+            self._own = None
+        ini = getSharedIniVars(self.filename, stamp)
+        if forChange:
+            ini = copy.deepcopy(ini)
+            self._own = (stamp, ini)
+        return ini
+    ini = property(_getIni)
+
+    def _write(self, ini):
+        """write the changed copy ini, it becomes the shared instance
+        """
+        writeSharedIniVars(ini)
+        self._own = None
+
     def __repr__(self):
         """return contents of sections
         """
+        ini = self._getIni()
         L = ["[%s]"% self.section ]
-        for k in self.ini.get(self.section):
-            v = self.ini.get(self.section, k)
+        for k in ini.get(self.section):
+            v = ini.get(self.section, k)
             L.append("%s=%s"% (k, v))
         return '\n'.join(L)
     
     def __iter__(self):
-        for item in self.ini.get(self.section):
+        for item in self._getIni().get(self.section):
             yield item         
             
     def get(self, key, defaultValue=None):
@@ -459,7 +543,7 @@ class InifileSection(object):
             defaultValue = ''
         else:
             defaultValue = str(defaultValue)
-        value = self.ini.get(self.section, key, defaultValue)
+        value = self._getIni().get(self.section, key, defaultValue)
 
         # value = win32api.GetProfileVal(self.section, key, defaultValue, self.filename)
 ##        if value:
@@ -478,10 +562,12 @@ class InifileSection(object):
         if value in [0, "0"]:
             self.delete(key)
         elif not value:
-            self.ini.delete(self.section, key)
+            # not written, only this instance sees the change:
+            self._getIni(forChange=1).delete(self.section, key)
         else:
-            self.ini.set(self.section, key, value)
-            self.ini.write()
+            ini = self._getIni(forChange=1)
+            ini.set(self.section, key, value)
+            self._write(ini)
             pass
             # win32api.WriteProfileVal( self.section, key, str(value), self.filename)
             # checkValue = win32api.GetProfileVal(self.section, key, 'nonsens', self.filename)
@@ -493,8 +579,9 @@ class InifileSection(object):
         """delete an item for a key (really set to "")
         
         """
-        self.ini.delete(self.section, key)
-        self.ini.write()
+        ini = self._getIni(forChange=1)
+        ini.delete(self.section, key)
+        self._write(ini)
         pass
         # print 'delete: %s, %s'% (self.section, key)
         # value = win32api.WriteProfileVal( self.section, key, None,
@@ -504,7 +591,7 @@ class InifileSection(object):
         #     print 'delete failed:  %s, %s: got %s instead'% (self.section, key, checkValue)
 
     def keys(self):
-        Keys = self.ini.get(self.section)
+        Keys = self._getIni().get(self.section)
         # Keys =  win32api.GetProfileSection( self.section, self.filename)
         # Keys = [k.split('=')[0].strip() for k in Keys]
         # #print 'return Keys: %s'% Keys
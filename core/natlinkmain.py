@@ -6,6 +6,12 @@
 # natlinkmain.py
 #   Base module for the Python-based command and control subsystem
 #
+# October 2026: status is the shared natlinkstatus.getNatlinkStatus() instance, and the status
+#    snapshot is refreshed at changeCallback user
+# October 2026: output to stdout and stderr is buffered (OutputBuffer) and passed to
+#    natlink.displayText on the main thread, see outputFlushInterval
+# October 2026: vocabularyChangeHooks (eg nsformat.clearWordInfoCache), called at user switch,
+#    mic on and after addWord, setWordInfo and deleteWord
 # July 2015 (QH): assume Unimacro at fixed place, extend macro files to BaseDirectory (Vocola),
 #    UnimacroDirectory, UserDirectory
 # August 2011 (QH): added function reorderKeys, which influences the order
@@ -89,30 +95,160 @@ import natlink
 import sys
 import traceback
 import types
+import threading
+import time
+import collections
+
+# output of print statements (stdout) and errors (stderr) is collected in outputBuffer,
+# and passed on to natlink.displayText on the main thread only (NatLink calls are not
+# thread-safe): at the begin and change callbacks, after the results of a grammar (see
+# natlinkutils.resultsDoneHooks), and when output written on the main thread has waited
+# outputFlushInterval seconds.  Errors written on the main thread are shown right away.
+# Output of other threads is shown at the next of these moments.
+# If more than outputBufferMax bytes of stdout output are waiting, the oldest of it is
+# dropped (errors are never dropped).
+# With outputFlushInterval = 0 each write on the main thread is shown right away.
+outputFlushInterval = 0.1
+outputBufferMax = 100000
+
+class OutputBuffer(object):
+    """collects the output of NewStdout and NewStderr for natlink.displayText
+
+    chunks are [isError, pieces, size] lists in the order they were written,
+    a chunk holds the pieces of one kind up to the end of a line.  The pieces
+    are joined when flushing, consecutive chunks of the same kind are passed
+    in one displayText call.  size is the number of bytes of stdout output,
+    dropped the number of lines of it that were dropped.
+    """
+    def __init__(self, flushInterval=0.1, maxBuffered=100000):
+        self.flushInterval = flushInterval
+        self.maxBuffered = maxBuffered
+        self.lock = threading.Lock()
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped = 0
+        self.firstWrite = None  # time of the oldest waiting output
+        self.mainThread = threading.current_thread()
+
+    def write(self, text, isError):
+        if not text:
+            return
+        with self.lock:
+            chunks = self.chunks
+            if chunks and chunks[-1][0] == isError and not chunks[-1][1][-1].endswith('\n'):
+                chunk = chunks[-1]
+                chunk[1].append(text)
+                chunk[2] += len(text)
+            else:
+                chunks.append([isError, [text], len(text)])
+            if not isError:
+                self.size += len(text)
+            if self.firstWrite is None:
+                self.firstWrite = time.time()
+            while self.size > self.maxBuffered:
+                self.dropped += self.dropOldestOutput()
+            due = isError or time.time() - self.firstWrite >= self.flushInterval
+        if due:
+            self.flush()
+
+    def dropOldestOutput(self):
+        """remove the oldest stdout chunk, return its number of lines
+        """
+        for i, chunk in enumerate(self.chunks):
+            if not chunk[0]:
+                del self.chunks[i]
+                self.size -= chunk[2]
+                text = ''.join(chunk[1])
+                return text.count('\n') + (not text.endswith('\n'))
+
+    def flush(self):
+        """pass the buffered output to natlink.displayText
+
+        does nothing when not called from the main thread
+        """
+        if threading.current_thread() is not self.mainThread:
+            return
+        with self.lock:
+            if not (self.chunks or self.dropped):
+                return
+            chunks, self.chunks = self.chunks, collections.deque()
+            dropped, self.dropped = self.dropped, 0
+            self.size = 0
+            self.firstWrite = None
+        if dropped:
+            natlink.displayText("===natlinkmain, %s lines of output dropped===\n"% dropped, 0)
+        isError, pieces = None, []
+        for chunk in chunks:
+            if chunk[0] != isError and pieces:
+                natlink.displayText(''.join(pieces), isError)
+                pieces = []
+            isError = chunk[0]
+            pieces.extend(chunk[1])
+        if pieces:
+            natlink.displayText(''.join(pieces), isError)
+
+outputBuffer = OutputBuffer(outputFlushInterval, outputBufferMax)
+
+def flushOutput():
+    """pass all buffered output to natlink.displayText now (main thread only)
+    """
+    outputBuffer.flush()
+
+# vocabularyChangeHooks are called when the vocabulary may have changed: at a user
+# switch, when the microphone is switched on (words may have been added or edited in
+# the Dragon vocabulary editor in the meantime), and after addWord, setWordInfo and
+# deleteWord below.  Add with addVocabularyChangeHook.
+vocabularyChangeHooks = []
+
+def addVocabularyChangeHook(func):
+    if func not in vocabularyChangeHooks:
+        vocabularyChangeHooks.append(func)
+
+def vocabularyChanged():
+    """call the vocabularyChangeHooks, after a change in the vocabulary
+    """
+    for func in vocabularyChangeHooks:
+        func()
+
+def addWord(*args):
+    """natlink.addWord, and call the vocabularyChangeHooks
+    """
+    try:
+        return natlink.addWord(*args)
+    finally:
+        vocabularyChanged()
+
+def setWordInfo(*args):
+    """natlink.setWordInfo, and call the vocabularyChangeHooks
+    """
+    try:
+        return natlink.setWordInfo(*args)
+    finally:
+        vocabularyChanged()
+
+def deleteWord(*args):
+    """natlink.deleteWord, and call the vocabularyChangeHooks
+    """
+    try:
+        return natlink.deleteWord(*args)
+    finally:
+        vocabularyChanged()
 
 class NewStdout(object):
     softspace=1
+    isError = 0
     def write(self,text):
         if text.find('\x00') >= 0:
             text = text.replace('\x00', '')
             text = "===Warning, text contains null bytes==\n" + text
         if type(text) == types.UnicodeType:
             text = text.encode('cp1252')
-        natlink.displayText(text, 0)
+        outputBuffer.write(text, self.isError)
     def flush(self):
-        pass
+        outputBuffer.flush()
 
-class NewStderr(object):
-    softspace=1
-    def write(self,text):
-        if text.find('\x00') >= 0:
-            text = text.replace('\x00', '')
-            text = "===Warning, text contains null bytes===\n" + text
-        if type(text) == types.UnicodeType:
-            text = text.encode('cp1252')
-        natlink.displayText(text, 1)
-    def flush(self):
-        pass
+class NewStderr(NewStdout):
+    isError = 1
 
 import inspect
 frame=inspect.currentframe()
@@ -158,7 +294,7 @@ try:
     reVocolaModuleName = re.compile(r'_vcl[0-9]?$')
     
     # status:
-    status = natlinkstatus.NatlinkStatus()
+    status = natlinkstatus.getNatlinkStatus()
     debugLoad = debugCallback = None
     canStartNatlink = True
     if status.getDNSInstallDir() == -1:
@@ -593,6 +729,7 @@ try:
     prevModInfo = None
     def beginCallback(moduleInfo, checkAll=None):
         global loadedFiles, prevModInfo
+        flushOutput()
         cbd = natlink.getCallbackDepth()
         if debugCallback:
             print 'beginCallback, cbd: %s'% cbd
@@ -642,10 +779,12 @@ try:
     def changeCallback(Type,args):
         global userName, DNSuserDirectory, language, userLanguage, userTopic, \
                 BaseModel, BaseTopic, DNSmode, changeCallbackUserFirst, shiftkey
+        flushOutput()
         
         if debugCallback:
             print 'changeCallback, Type: %s, args: %s'% (Type, args)
         if Type == 'mic' and args == 'on':
+            vocabularyChanged()
             if debugCallback:
                 print 'findAndLoadFiles...'
             moduleInfo = natlink.getCurrentModule()
@@ -665,10 +804,12 @@ try:
                 print("\n--- user changed to: %s"% args[0])
                 
             unloadEverything()
+            vocabularyChanged()
     ## this is not longer needed here, as we fixed the userDirectory
     ##        changeUserDirectory()
             status.clearUserInfo()
             status.setUserInfo(args)
+            natlinkstatus.refreshStatusSnapshot(status)
             language = status.getLanguage()
             DNSuserDirectory = status.getDNSuserDirectory()
             userLanguage = status.getUserLanguage()
@@ -880,9 +1021,11 @@ try:
             print status.getWarningText()
             print '='*30
             status.emptyWarning()
+        flushOutput()
     
     # try to establish here only one automatic startup of start_natlink:
     def natDisconnect():
+        flushOutput()
         natlink.natDisconnect()
         if debugLoad:
             print 'after natDisconnect'
@@ -26,11 +26,11 @@ def start():
 ##
 
 def updateUnimacroHeaderIfNeeded():
-    status = natlinkstatus.NatlinkStatus()
-    if not status.getVocolaTakesUnimacroActions(): 
+    status = natlinkstatus.getStatusSnapshot()
+    if not status.VocolaTakesUnimacroActions: 
         return
         
-    destDir              = status.getVocolaUserDirectory()
+    destDir              = status.VocolaUserDirectory
     coreFolder           = os.path.split(__file__)[0]
     sourceDir            = os.path.normpath(os.path.join(coreFolder, "..", "..", "..",
                                         "Unimacro", 'vocola_compatibility'))
@@ -77,14 +77,14 @@ def vocolaGetModTime(file):
 ## 
 
 def create_new_language_subdirectory_if_needed():
-    status        = natlinkstatus.NatlinkStatus()
-    VocolaEnabled = not not status.getVocolaUserDirectory()
-    language      = status.getLanguage()
-    commandFolder = natlinkstatus.NatlinkStatus().getVocolaUserDirectory()
+    status        = natlinkstatus.getStatusSnapshot()
+    VocolaEnabled = not not status.VocolaUserDirectory
+    language      = status.language
+    commandFolder = status.VocolaUserDirectory
     if not os.path.isdir(commandFolder):                      
         commandFolder = None
 
-    if VocolaEnabled and status.getVocolaTakesLanguages():
+    if VocolaEnabled and status.VocolaTakesLanguages:
         if language != 'enx' and commandFolder:
             uDir  = commandFolder
             uDir2 = os.path.join(uDir, language)
@@ -109,7 +109,7 @@ def copyVclFileLanguageVersion(Input, Output):
     Output    = os.path.normpath(Output)
     input     = open(Input, 'r').read()
     output    = open(Output, 'w')
-    language      = natlinkstatus.NatlinkStatus().getLanguage()
+    language      = natlinkstatus.getStatusSnapshot().language
     output.write("# vocola file for alternate language: %s\n"% language)
     lines = map(string.strip, str(input).split('\n'))
     for line in lines:
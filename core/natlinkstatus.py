@@ -7,6 +7,11 @@ __version__ = "4.1whiskey3"
 #
 #----------------------------------------------------------------------------
 #
+# October 2026: one shared NatlinkStatus instance (getNatlinkStatus) and a read-only
+#               snapshot of the status (getStatusSnapshot), only computed again after
+#               changeCallback user (refreshStatusSnapshot) or when one of the ini files
+#               changed. The ini files are read via getProfileVal, so outside Windows
+#               the ini parts can be tested on fixture files.
 # 4.1whiskey, minor changes, 12/11/2018
 # 4.1victor, changes for DPI15, nearly stable, waiting for Mark getting SendKeys implemented.
 #
@@ -176,16 +181,27 @@ getDNSName: return "NatSpeak" for versions <= 11 and "Dragon" for 12 (on)
 getAhkExeDir: return the directory where AutoHotkey is found (only needed when not in default)
 getAhkUserDir: return User Directory of AutoHotkey, not needed when it is in default.
 
+new 2026 (module functions):
+getNatlinkStatus: return the NatlinkStatus instance shared by natlinkmain, natlinkstartup etc.
+getStatusSnapshot: return a read-only StatusSnapshot of getNatlinkStatusDict and the user info,
+    computed again only when natlinkstatus.ini, nssystem.ini or nsapps.ini changed
+refreshStatusSnapshot: compute the snapshot again, called at changeCallback user
+
 """
 import six
 
-import os, re, win32api, win32con, sys, pprint, stat
-import RegistryDict
+import os, re, sys, pprint, stat
+if sys.platform == 'win32':
+    import win32api, win32con, pywintypes
+    import RegistryDict
+else:
+    # outside Windows only the ini file parts work (eg for testing on fixture files)
+    win32api = win32con = pywintypes = RegistryDict = None
 import natlinkcorefunctions
-import pywintypes
 import time
 import types
 import inivars
+import ConfigParser
 # for getting generalised env variables:
 
 ##from win32com.shell import shell, shellcon
@@ -372,6 +388,28 @@ class NatlinkStatus(object):
             if not skipSpecialWarning:
                 self.warning('WARNING: invalid or no version of natlink.pyd found\nClose Dragon and then run the\nconfiguration program "configurenatlink.pyw" via "start_configurenatlink.py"')
             
+    def clearCache(cls):
+        """forget the directories that are looked up only once from natlinkstatus.ini
+        
+        the directories that do not come from natlinkstatus.ini (CoreDirectory,
+        UnimacroDirectory, DNSInstallDir, DNSIniDir etc.) are kept.
+        """
+        for attr in ('UserDirectory', 'UnimacroUserDirectory',
+                     'VocolaUserDirectory', 'AhkUserDir', 'AhkExeDir'):
+            setattr(cls, attr, None)
+    clearCache = classmethod(clearCache)
+
+    def getWatchedIniFiles(self):
+        """return the ini files the status depends on
+        
+        natlinkstatus.ini, and nssystem.ini and nsapps.ini if DNSIniDir is valid
+        """
+        files = [self.userregnl.filename]
+        if self.DNSIniDir and self.DNSIniDir != -1:
+            files.append(os.path.join(self.DNSIniDir, self.NSSystemIni))
+            files.append(os.path.join(self.DNSIniDir, self.NSAppsIni))
+        return files
+
     def getWarningText(self):
         """return a printable text if there were warnings
         """
@@ -513,13 +551,15 @@ Please try to correct this by running the NatLink Config Program (with administr
         # all well
         return 1
 
-    def getHKLMPythonPathDict(self, flags=win32con.KEY_READ):
+    def getHKLMPythonPathDict(self, flags=None):
         """returns the dict that contains the PythonPath section of HKLM
         
         by default read only, can be called (from natlinkconfigfunctions with
         KEY_ALL_ACCESS, so key can be created)
         
         """
+        if flags is None:
+            flags = win32con.KEY_READ
         version = self.getPythonVersion()
         if not version:
             fatal_error("no valid Python version available")
@@ -824,8 +864,7 @@ Please try to correct this by running the NatLink Config Program (with administr
         nssystemini = self.getNSSYSTEMIni()
         nsappsini = self.getNSAPPSIni()
         if nssystemini and os.path.isfile(nssystemini):
-            version =win32api.GetProfileVal( "Product Attributes", "Version" , "",
-                                          nssystemini)
+            version = getProfileVal("Product Attributes", "Version" , "", nssystemini)
 
             return version
         return ''
@@ -1084,13 +1123,13 @@ Please try to correct this by running the NatLink Config Program (with administr
         if not os.path.isfile(nssystemini):
             return 0
             # raise IOError("NatlinkIsEnabled, not a valid file: %s"% nssystemini)
-        actual1 = win32api.GetProfileVal(self.section1, self.key1, "", nssystemini)
+        actual1 = getProfileVal(self.section1, self.key1, "", nssystemini)
 
 
         nsappsini = self.getNSAPPSIni()
         if not os.path.isfile(nsappsini):
             raise IOError("NatlinkIsEnabled, not a valid file: %s"% nsappsini)
-        actual2 = win32api.GetProfileVal(self.section2, self.key2, "", nsappsini)
+        actual2 = getProfileVal(self.section2, self.key2, "", nsappsini)
         if self.value1 == actual1:
             if self.value2 == actual2:
                 # enabled:
@@ -1645,6 +1684,119 @@ Please try to correct this by running the NatLink Config Program (with administr
             List.append("\t%s\t%s"% (Key,value))
         del Dict[Key]
 
+class StatusSnapshot(object):
+    """read-only copy of the NatLink status
+    
+    made by getStatusSnapshot or refreshStatusSnapshot, so can be shared freely.
+    Values are available as attributes or items (the keys of getNatlinkStatusDict,
+    plus language, userLanguage and userTopic):
+    
+    snapshot = getStatusSnapshot()
+    snapshot.DNSVersion, snapshot['vocolaIsEnabled']
+    
+    stamps: the (mtime, size) of the watched ini files when the snapshot was made
+    """
+    def __init__(self, D, stamps):
+        object.__setattr__(self, '_dict', dict(D))
+        object.__setattr__(self, 'stamps', tuple(stamps))
+
+    def __getattr__(self, key):
+        try:
+            return self._dict[key]
+        except KeyError:
+            raise AttributeError("StatusSnapshot has no value %s"% key)
+
+    def __setattr__(self, key, value):
+        raise TypeError("StatusSnapshot is read-only, cannot set %s"% key)
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+    def __contains__(self, key):
+        return key in self._dict
+
+    def get(self, key, defaultValue=None):
+        return self._dict.get(key, defaultValue)
+
+    def keys(self):
+        return self._dict.keys()
+
+    def getDict(self):
+        """return a (changeable) copy of the values"""
+        return dict(self._dict)
+
+    def isValid(self, files):
+        """true if the stamps of files are still the same as when the snapshot was made"""
+        return self.stamps == tuple(map(natlinkcorefunctions.getFileStamp, files))
+
+    def __repr__(self):
+        return 'StatusSnapshot(%s)'% pprint.pformat(self._dict)
+
+sharedStatus = None
+statusSnapshot = None
+
+def getNatlinkStatus():
+    """return the NatlinkStatus instance that is shared in this process
+    """
+    global sharedStatus
+    if sharedStatus is None:
+        sharedStatus = NatlinkStatus()
+    return sharedStatus
+
+def getStatusSnapshot(status=None):
+    """return a StatusSnapshot, only computed again if one of the ini files changed
+    
+    status: the NatlinkStatus instance to take the values from, default getNatlinkStatus()
+    """
+    if status is None:
+        status = getNatlinkStatus()
+    if statusSnapshot is None or not statusSnapshot.isValid(status.getWatchedIniFiles()):
+        return refreshStatusSnapshot(status)
+    return statusSnapshot
+
+def refreshStatusSnapshot(status=None):
+    """compute the StatusSnapshot again, called from natlinkmain at changeCallback user
+    """
+    global statusSnapshot
+    if status is None:
+        status = getNatlinkStatus()
+    files = status.getWatchedIniFiles()
+    stamps = map(natlinkcorefunctions.getFileStamp, files)
+    if statusSnapshot is not None and statusSnapshot.stamps[:1] != tuple(stamps[:1]):
+        # natlinkstatus.ini changed, so may have the directories read from it:
+        status.clearCache()
+    D = status.getNatlinkStatusDict()
+    for key in ('language', 'userLanguage', 'userTopic'):
+        D[key] = status.userArgsDict.get(key, '')
+    statusSnapshot = StatusSnapshot(D, stamps)
+    return statusSnapshot
+
+def clearStatusSnapshot():
+    """forget the snapshot, the next getStatusSnapshot computes it again
+    """
+    global statusSnapshot
+    statusSnapshot = None
+
+def getProfileVal(section, key, defaultValue, filename):
+    """get a value from an ini file (nssystem.ini, nsapps.ini)
+    
+    on Windows via the system call, elsewhere via ConfigParser (inivars does not
+    accept the keys starting with a dot), so the ini parts of this module can
+    be tested on fixture files.  Dragon writes lines without a value too, these
+    give defaultValue, as does a file that cannot be parsed.
+    """
+    if sys.platform == 'win32':
+        return win32api.GetProfileVal(section, key, defaultValue, filename)
+    parser = ConfigParser.RawConfigParser(allow_no_value=True)
+    try:
+        parser.read(filename)
+        value = parser.get(section, key)
+    except ConfigParser.Error:
+        return defaultValue
+    if value is None:
+        return defaultValue
+    return value
+
 def getFileDate(modName):
     try: return os.stat(modName)[stat.ST_MTIME]
     except OSError: return 0        # file not found
@@ -1671,7 +1823,7 @@ def AddNatlinkEnvironmentVariables(status=None):
     """make the special NatLink variables global in this module
     """
     if status is None:
-        status = NatlinkStatus()
+        status = getNatlinkStatus()
     D = status.getNatlinkStatusDict()
     natlinkVarsDict = {}
     for k, v in D.items():
@@ -6,6 +6,21 @@
 # natlinkutils.py
 #   This file contains utility classes and functions for grammar files.
 #
+# October 2026
+#   - GrammarBase.load caches parsed grammars by hash of the grammar text and of
+#     gramparser (gramCache, and gramCacheDir in the user's application data, both
+#     limited in size), so unchanged grammars are not parsed again
+#   - callIfExists uses a handler table of the callback functions (gotBegin, gotResults_XXX
+#     etc), built at load/activate time. The table holds the functions of the class, not
+#     bound methods, so a grammar is no part of a reference cycle (it has a __del__).
+#     Call invalidateHandlers() after patching methods.
+#   - resultsDoneHooks are called when a grammar has handled its results (eg for
+#     showing the output of the gotResults functions, see natlinkmain.OutputBuffer)
+#   - GrammarBase keeps a copy of its lists (listShadow), setList only sends the
+#     changes (see diffList)
+#   - GrammarBase.activateSet computes the rules to (de)activate with sets, and only
+#     passes changed (rule, window) pairs to the gramObj
+#
 # November 2018 (QH)
 #   Accept unicode input, convert to python 2.6 string
 #
@@ -82,6 +97,9 @@ import six
 import os, os.path, copy, types
 import struct
 import time
+import hashlib
+import cPickle
+import collections
 #from natlink import *
 import natlink
 #from gramparser import *
@@ -166,6 +184,22 @@ dgnwordflag_topicadded		= 0x40000000
 dgnwordflag_DNS8newwrdProp  = 0x20000000
  
 
+#---------------------------------------------------------------------------
+# resultsDoneHooks
+#
+# Functions (without arguments) which are called after GrammarBase.resultsCallback
+# has called the gotResults functions of a grammar, also if these raise an error.
+# Add with addResultsDoneHook.
+
+resultsDoneHooks = []
+
+def addResultsDoneHook(func):
+    if func not in resultsDoneHooks:
+        resultsDoneHooks.append(func)
+
+# show the output of the gotResults functions (see natlinkmain.OutputBuffer):
+addResultsDoneHook(natlinkmain.flushOutput)
+
 #---------------------------------------------------------------------------
 # matchWindow
 #
@@ -309,19 +343,220 @@ def playString(keys, hooks=None):
             shiftkey = natlinkmain.shiftkey
             natlink.playString(shiftkey + keys)
 
+#---------------------------------------------------------------------------
+# Parsed grammar cache
+#
+# GrammarBase.load parses and packs a grammar only if the (split apart) grammar
+# text was not seen before. The results are kept in memory (gramCache, at most
+# gramCacheMax grammars) and, if gramCacheDir is not None, in a pickle file per
+# grammar in that directory (at most gramCacheMaxFiles files, the least recently
+# used ones are removed).
+# The key is the sha1 of the grammar text, the source of gramparser.py and
+# gramCacheVersion (to bump when the format of the cached results changes).
+
+gramCacheVersion = 1
+gramCacheMax = 100
+gramCacheMaxFiles = 300
+gramCache = collections.OrderedDict()
+
+def getGramCacheDir():
+    """return the directory for the grammar cache files
+    
+    Natlink\\gramcache in the application data of the user (%APPDATA%), or
+    ~/.natlink/gramcache if there is no APPDATA
+    """
+    appData = os.environ.get('APPDATA')
+    if appData:
+        return os.path.join(appData, 'Natlink', 'gramcache')
+    return os.path.join(os.path.expanduser('~'), '.natlink', 'gramcache')
+
+gramCacheDir = getGramCacheDir()
+
+def getGramparserHash():
+    """return the sha1 of the source of gramparser, so a changed parser
+    does not use the results of the previous one
+    """
+    filepath = os.path.splitext(gramparser.__file__)[0] + '.py'
+    if not os.path.isfile(filepath):
+        filepath = gramparser.__file__
+    try:
+        f = open(filepath, 'rb')
+        try:
+            return hashlib.sha1(f.read()).hexdigest()
+        finally:
+            f.close()
+    except IOError:
+        return ''
+
+gramparserHash = getGramparserHash()
+
+def getGrammarKey(gramSpec):
+    """return the cache key of a grammar (list of lines)
+    """
+    h = hashlib.sha1('gramCacheVersion %s\ngramparser %s\n'% (gramCacheVersion, gramparserHash))
+    for line in gramSpec:
+        if type(line) == six.text_type:
+            line = line.encode('utf-8')
+        h.update(line)
+        h.update('\n')
+    return h.hexdigest()
+
+def getParsedGrammar(gramSpec, grammarName=None):
+    """return (key, parsed) for a grammar, parse only if not in the cache
+    
+    parsed is a dict with gramBin (the packed grammar), exportRules and knownLists
+    (lists of names) and knownRules (dict name: number). After a new parse also
+    scanObj (the scanner, for error messages) is present.
+    """
+    key = getGrammarKey(gramSpec)
+    parsed = gramCache.pop(key, None)
+    if parsed is not None:
+        gramCache[key] = parsed  # most recently used at the end
+        return key, parsed
+    parsed = readParsedGrammar(key)
+    if parsed is None:
+        parser = gramparser.GramParser(gramSpec, grammarName=grammarName)
+        parser.doParse()
+        parser.checkForErrors()
+        parsed = dict(gramBin=gramparser.packGrammar(parser),
+                      exportRules=parser.exportRules.keys(),
+                      knownLists=parser.knownLists.keys(),
+                      knownRules=parser.knownRules.copy())
+        writeParsedGrammar(key, parsed)
+        cacheParsedGrammar(key, parsed)
+        result = parsed.copy()
+        result['scanObj'] = parser.scanObj
+        return key, result
+    cacheParsedGrammar(key, parsed)
+    return key, parsed
+
+def cacheParsedGrammar(key, parsed):
+    """keep a parsed grammar in memory, forget the least recently used ones
+    """
+    gramCache[key] = parsed
+    while len(gramCache) > gramCacheMax:
+        gramCache.popitem(last=False)
+
+def readParsedGrammar(key):
+    """read a parsed grammar from gramCacheDir, None if not available
+    """
+    if not gramCacheDir:
+        return
+    filepath = os.path.join(gramCacheDir, key + '.pickle')
+    if not os.path.isfile(filepath):
+        return
+    try:
+        f = open(filepath, 'rb')
+        try:
+            parsed = cPickle.load(f)
+        finally:
+            f.close()
+    except Exception:
+        print 'natlinkutils, invalid grammar cache file, removed: %s'% filepath
+        discardParsedGrammar(key)
+        return
+    # the mtime tells which files were used least recently:
+    try:
+        os.utime(filepath, None)
+    except OSError:
+        pass
+    return parsed
+
+def writeParsedGrammar(key, parsed):
+    """write a parsed grammar to gramCacheDir (if set), errors are ignored
+    """
+    if not gramCacheDir:
+        return
+    filepath = os.path.join(gramCacheDir, key + '.pickle')
+    if os.path.isfile(filepath):
+        return
+    tmpPath = filepath + '.%s.tmp'% os.getpid()
+    try:
+        if not os.path.isdir(gramCacheDir):
+            os.makedirs(gramCacheDir)
+        f = open(tmpPath, 'wb')
+        try:
+            cPickle.dump(parsed, f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmpPath, filepath)
+    except (IOError, OSError):
+        if debugLoad: print 'natlinkutils, could not write grammar cache file: %s'% filepath
+        if os.path.isfile(tmpPath):
+            os.remove(tmpPath)
+        return
+    pruneGrammarCacheDir()
+
+def pruneGrammarCacheDir(maxFiles=None):
+    """remove the least recently used cache files, so at most maxFiles
+    (default gramCacheMaxFiles) are left
+    """
+    if maxFiles is None:
+        maxFiles = gramCacheMaxFiles
+    try:
+        names = [name for name in os.listdir(gramCacheDir) if name.endswith('.pickle')]
+    except OSError:
+        return
+    if len(names) <= maxFiles:
+        return
+    files = []
+    for name in names:
+        filepath = os.path.join(gramCacheDir, name)
+        try:
+            files.append((os.path.getmtime(filepath), filepath))
+        except OSError:
+            pass
+    files.sort()
+    for mtime, filepath in files[:len(files) - maxFiles]:
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+def discardParsedGrammar(key):
+    """remove a grammar from the cache (memory and disk)
+    """
+    gramCache.pop(key, None)
+    if not gramCacheDir:
+        return
+    filepath = os.path.join(gramCacheDir, key + '.pickle')
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+def clearGrammarCache(onDisk=1):
+    """empty the grammar cache, and remove the cache files if onDisk
+    """
+    gramCache.clear()
+    if onDisk and gramCacheDir and os.path.isdir(gramCacheDir):
+        for name in os.listdir(gramCacheDir):
+            if name.endswith('.pickle'):
+                try:
+                    os.remove(os.path.join(gramCacheDir, name))
+                except OSError:
+                    pass
+
 #---------------------------------------------------------------------------
 # (internal use) shared base class for all Grammar base classes.  Do not use
 # this class directly.  See GrammarBase, DictGramBase or SelectGramBase.
 
 class GramClassBase(object):
 
+    # prefixes of the callback functions that are collected in the handler table:
+    handlerPrefixes = ('gotBegin', 'gotHypothesis', 'gotResults')
+    # set to 1 (or call invalidateHandlers) after patching callback methods
+    handlersDirty = 1
+
     def __init__(self):
         self.gramObj = natlink.GramObj()
+        self.handlerTable = {}
 
     def __del__(self):
         self.gramObj.unload()
 
     def load(self,grammar,allResults=0,hypothesis=0):        
+        self.buildHandlerTable()
         self.gramObj.setBeginCallback(self.beginCallback)
         self.gramObj.setResultsCallback(self.resultsCallback)
         self.gramObj.setHypothesisCallback(self.hypothesisCallback)
@@ -332,8 +567,11 @@ class GramClassBase(object):
         self.gramObj.setBeginCallback(None)
         self.gramObj.setResultsCallback(None)
         self.gramObj.setHypothesisCallback(None)
+        self.handlerTable = {}
+        self.handlersDirty = 1
 
     def activate(self,window=0,exclusive=None):
+        if self.handlersDirty: self.buildHandlerTable()
         self.gramObj.activate('',window)
         if exclusive != None:
             self.setExclusive(exclusive)
@@ -354,10 +592,66 @@ class GramClassBase(object):
     # if that member function is defined.
 
     def callIfExists(self, funcName, argList):
-        try: func = getattr(self, funcName)
-        except AttributeError: pass
-        else:
-            return apply(func, argList)
+        if self.handlersDirty: self.buildHandlerTable()
+        try: func = self.handlerTable[funcName]
+        except KeyError:
+            # not a callback name, or added after the table was built:
+            func = self.resolveHandler(funcName)
+            self.handlerTable[funcName] = func
+        if func is not None:
+            return self.callHandler(func, argList)
+
+    def resolveHandler(self, name):
+        """return the handler table entry of callback name
+
+        This is the function of the class (called with self), so the table
+        holds no bound methods (they would make a reference cycle with the
+        grammar, which Python 2 does not collect because of __del__). A
+        callback set on the instance, or that is not a plain method, is kept
+        by name and looked up at each call. None if there is no callback.
+        """
+        if name in getattr(self, '__dict__', {}):
+            if callable(self.__dict__[name]):
+                return name
+            return None
+        attr = getattr(type(self), name, None)
+        if isinstance(attr, types.MethodType) and attr.im_self is None:
+            return attr.im_func
+        if callable(getattr(self, name, None)):
+            return name
+        return None
+
+    def callHandler(self, func, argList):
+        """call an entry of the handler table (see resolveHandler)
+        """
+        if type(func) == types.StringType:
+            return apply(getattr(self, func), argList)
+        return apply(func, (self,) + tuple(argList))
+
+    def buildHandlerTable(self):
+        """resolve the gotBegin, gotResults... callbacks once (see resolveHandler)
+
+        Functions that are not defined are stored as None, so callIfExists
+        does no attribute lookups during recognition. After patching callback
+        methods, call invalidateHandlers (or set self.handlersDirty).
+        """
+        table = {}
+        for prefix in self.handlerPrefixes:
+            table[prefix] = None
+        for name in dir(self):
+            if name.startswith(self.handlerPrefixes):
+                func = self.resolveHandler(name)
+                if func is not None:
+                    table[name] = func
+        for name in ('gotResultsObject', 'gotResultsInit'):
+            table.setdefault(name, None)
+        self.handlerTable = table
+        self.handlersDirty = 0
+
+    def invalidateHandlers(self):
+        """rebuild the handler table at the next callback
+        """
+        self.handlersDirty = 1
 
 #---------------------------------------------------------------------------
 # GrammarBase
@@ -401,8 +695,10 @@ class GramClassBase(object):
 #   activateSet( ruleNames, window=0, exclusive=None )
 #       This is the most efficient way to activate rules, it takes a list of
 #       rules and makes sure that all those rules and only those rules are
-#       active.  Do not use this function to change the window handle if you
-#       have already activates some rules with a different window handle.
+#       active.  Rules that are already active for window are not passed to
+#       the gramObj again.  Do not use this function to change the window
+#       handle if you have already activates some rules with a different
+#       window handle.
 #
 #   activateAll( window=0, exclusive=None, exceptlist=None )
 #       This will activate every exported rule.
@@ -434,7 +730,10 @@ class GramClassBase(object):
 #
 #   setList( listName, words )
 #       This function is an efficient way to set the contents of a list in    
-#       one operation to a list of words or phrases.
+#       one operation to a list of words or phrases.  The grammar keeps a
+#       copy of each list (listShadow), so an unchanged list is not sent
+#       again, and only the new words are appended when no words were
+#       removed (see diffList).
 #
 # Derived classes should defined callback functions if they want recognition
 # results.  The following callback functions can be defined:
@@ -499,6 +798,28 @@ class GramClassBase(object):
 #   gotResults( ['this','big','red','object','is','good'], ... )
 #
 
+def diffList(oldWords, newWords):
+    """return (additions, removals) to go from the words of oldWords to newWords
+
+    order and duplicates are ignored, additions keep the order of newWords:
+    
+>>> diffList(['a', 'b', 'c'], ['c', 'd', 'a', 'd'])
+(['d'], ['b'])
+>>> diffList(['a', 'b'], ('b', 'a'))
+([], [])
+    """
+    oldSet = set(oldWords)
+    additions = []
+    seen = set()
+    for w in newWords:
+        if w in oldSet or w in seen:
+            continue
+        seen.add(w)
+        additions.append(w)
+    newSet = set(newWords)
+    removals = [w for w in oldWords if w not in newSet]
+    return additions, removals
+
 class GrammarBase(GramClassBase):
 
     def __init__(self):
@@ -507,6 +828,7 @@ class GrammarBase(GramClassBase):
         self.activeRules = {}
         self.validRules = []
         self.validLists = []
+        self.listShadow = {}  # {listName: words as sent to the gramObj}
         self.doOnlyGotResultsObject = None # can rarely be set (QH, dec 2009)
 
     def load(self,gramSpec,allResults=0,hypothesis=0, grammarName=None):
@@ -533,28 +855,49 @@ class GrammarBase(GramClassBase):
             
 
         gramparser.splitApartLines(gramSpec)
-        parser = gramparser.GramParser(gramSpec, grammarName=grammarName)
-        parser.doParse()
-        parser.checkForErrors()
-        gramBin = gramparser.packGrammar(parser)
-        self.scanObj = parser.scanObj  # for later error messages.
+        key, parsed = getParsedGrammar(gramSpec, grammarName)
+        gramBin = parsed['gramBin']
+        self.scanObj = parsed.get('scanObj')  # for later error messages.
+        if self.scanObj is None:
+            self.scanObj = gramparser.GramScanner(gramSpec, grammarName=grammarName)
+            self.scanObj.phase = "after"
         try:
             GramClassBase.load(self,gramBin,allResults,hypothesis)
         except natlink.BadGrammar:
             print 'GrammarBase, cannot load grammar, BadGrammar:\n%s\n'% gramSpec
+            discardParsedGrammar(key)
             raise
         # we want to keep a list of the rules which can be activated and the
         # known lists so we can catch errors earlier
-        self.validRules = parser.exportRules.keys()
-        self.validLists = parser.knownLists.keys()
+        self.validRules = list(parsed['exportRules'])
+        self.validLists = list(parsed['knownLists'])
+        # lists of a freshly loaded grammar are empty:
+        self.listShadow = dict([(listName, []) for listName in self.validLists])
 
         # we reverse the rule dictionary so we can convert rule numbers back
         # to rule names during recognition
         self.ruleMap = {}
-        for x in parser.knownRules.keys():
-            self.ruleMap[ parser.knownRules[x] ] = x
+        knownRules = parsed['knownRules']
+        for x in knownRules.keys():
+            self.ruleMap[ knownRules[x] ] = x
+        self.buildRuleHandlers()
         return 1
 
+    def buildHandlerTable(self):
+        GramClassBase.buildHandlerTable(self)
+        self.buildRuleHandlers()
+
+    def buildRuleHandlers(self):
+        """map each rule name to its gotResults_XXX function (or None)
+        """
+        ruleHandlers = {}
+        for ruleName in getattr(self, 'ruleMap', {}).values():
+            funcName = 'gotResults_'+ruleName
+            func = self.handlerTable.get(funcName)
+            self.handlerTable[funcName] = func
+            ruleHandlers[ruleName] = func
+        self.ruleHandlers = ruleHandlers
+
     # these are wrappers for the GramObj base methods.  We also keep track of
     # legal rules, lists and active rules so we can do some first level error
     # checking
@@ -566,9 +909,12 @@ class GrammarBase(GramClassBase):
             self.validRules.pop()
         while self.validLists:
             self.validLists.pop()
+        self.listShadow.clear()
         self.exclusiveState = 0
+        self.ruleHandlers = {}
 
     def activate(self, ruleName, window=0, exclusive=None, noError=0):
+        if self.handlersDirty: self.buildHandlerTable()
         if type(ruleName) == six.text_type:
             ruleName = utilsqh.convertToBinary(ruleName)
         if ruleName not in self.validRules:
@@ -610,45 +956,54 @@ class GrammarBase(GramClassBase):
         """activate a set of rules.
 
         Try new strategy, based on the trick of Vocola. Natlink does not work completely correct here.        
+
+        The wanted rules are compared with activeRules as sets, so only the
+        changes are passed to the gramObj: a rule that is already active for
+        window is left alone, a rule that is active for another window is
+        activated again for window. A rule that is not wanted is deactivated,
+        unless it is active for another (non global) window.
+        The changes go through self.deactivate and self.activate, so subclasses
+        that override these see them.
+        This is called from gotBegin for each utterance, so keep it cheap.
         """
-        if type(ruleNames) == types.ListType:
-            rulenames = copy.copy(ruleNames) # so we can pop items
-        elif type(ruleNames) == types.TupleType:
-            rulenames = list(ruleNames) # so we can pop items
-        else:
+        if not type(ruleNames) in (types.ListType, types.TupleType):
             raise TypeError("activateSet, ruleNames (%s) must be a list or a tuple, not: %s"%
                             (repr(ruleNames), type(ruleNames)))
-        activeKeys = self.activeRules.keys()
-        for x in activeKeys:
+        wanted = set()
+        for x in ruleNames:
+            if type(x) == six.text_type:
+                x = utilsqh.convertToBinary(x)
+            wanted.add(x)
+        activeRules = self.activeRules
+        toDeactivate = []
+        for x, curWindow in activeRules.iteritems():
             if type(x) != six.binary_type:
                 raise TypeError('activateSet, rulename "%s" should be of binary_type, not: %s'% (x, type(x)))
-
-            curWindow = self.activeRules[x]
-            if x in rulenames:
+            if x in wanted:
                 if curWindow == window:
-                    rulenames.remove(x)
-                    if debugLoad: print 'activateSet, rule %s already active for %s'% (x, window)
+                    wanted.discard(x)
                 else:
                     if debugLoad: print 'activateSet, rule %s, change from window %s to window %s'% (x, curWindow, window)
-                    self.deactivate(x)
-                    # self.activate(x, window)
-                    # rulenames.remove(x)
+                    toDeactivate.append(x)
+            elif window == curWindow or window == 0 or curWindow == 0:
+                # same window or a global rule involved: deactivate
+                if debugLoad: print 'activateSet, do not want %s, deactivate, previous window: %s'% (x, curWindow)
+                toDeactivate.append(x)
             else:
-                # if same window, deactivate, otherwise just leave...
-                # deactivate direct to gramObj here:
-                if window == curWindow:
-                    if debugLoad: print 'activateSet, do not want %s, so deactivate, same window: %s'% (x, curWindow)
-                    self.deactivate(x)
-                elif window == 0:
-                    if debugLoad: print 'activateSet, deactivate rule %s (global), previous window: %s'% (x, curWindow)
-                    self.deactivate(x)
-                elif curWindow == 0:
-                    if debugLoad: print 'activateSet, deactivate global rule %s, new window window: %s'% (x, window)
-                    self.deactivate(x)
-                else:
-                    if debugLoad: print 'activateSet, deactivate not needed, different window: rule %s, previous window: %s new window: %s'% (x, curWindow, window)             
-        for x in rulenames:
-            self.activate(x, window)
+                if debugLoad: print 'activateSet, deactivate not needed, different window: rule %s, previous window: %s new window: %s'% (x, curWindow, window)
+        if wanted:
+            invalid = wanted.difference(self.validRules)
+            if invalid:
+                raise gramparser.GrammarError( "rule %s was not exported in the grammar" % sorted(invalid)[0], self.scanObj)
+        for x in toDeactivate:
+            self.deactivate(x)
+        if wanted:
+            for x in ruleNames:
+                if type(x) == six.text_type:
+                    x = utilsqh.convertToBinary(x)
+                if x in wanted:
+                    self.activate(x, window)
+                    wanted.discard(x)
         if not exclusive is None:
             self.setExclusive(exclusive)
 
@@ -731,25 +1086,56 @@ class GrammarBase(GramClassBase):
         if listName not in self.validLists:
             raise gramparser.GrammarError( "list %s was not defined in the grammar" % listName , self.scanObj)
         self.gramObj.emptyList(listName)
+        self.listShadow[listName] = []
 
     def appendList(self, listName, words):
         listName = utilsqh.convertToBinary(listName)
         if listName not in self.validLists:
             raise gramparser.GrammarError( "list %s was not defined in the grammar" % listName , self.scanObj)
-        if type(words) in (six.binary_type, six.text_type):
-            words = utilsqh.convertToBinary(words)
-            self.gramObj.appendList(listName,words)
-        else:
-            for x in words:
-                if type(x) == six.text_type:
-                    x = utilsqh.convertToBinary(x)
-                self.gramObj.appendList(listName,x)
+        words = self.convertListWords(words)
+        shadow = self.listShadow.get(listName)
+        for x in words:
+            self.gramObj.appendList(listName,x)
+            if shadow is not None:
+                shadow.append(x)
     
     def setList(self, listName, words):
+        """set the contents of a list, sending only the changes to the gramObj
+
+        if no words were removed, only the new words are appended, otherwise
+        (natlink cannot remove a single word) the list is emptied and filled again.
+        If the contents of the list are not known (eg after a direct call to the gramObj),
+        the list is also emptied and filled again.
+        """
         if type(listName) == six.text_type:
             listName = utilsqh.convertToBinary(listName)
+        if listName not in self.validLists:
+            raise gramparser.GrammarError( "list %s was not defined in the grammar" % listName , self.scanObj)
+        words = self.convertListWords(words)
+        shadow = self.listShadow.get(listName)
+        if shadow is not None:
+            additions, removals = diffList(shadow, words)
+            if not (additions or removals):
+                if debugLoad: print 'setList, list %s unchanged'% listName
+                return
+            if not removals:
+                if debugLoad: print 'setList, list %s, append %s word(s)'% (listName, len(additions))
+                self.appendList(listName, additions)
+                return
         self.emptyList(listName)
-        self.appendList(listName, words) # other way around?
+        self.appendList(listName, words)
+
+    def convertListWords(self, words):
+        """return words (a single word or a sequence of words) as a list of binary strings
+        """
+        if type(words) in (six.binary_type, six.text_type):
+            return [utilsqh.convertToBinary(words)]
+        result = []
+        for x in words:
+            if type(x) == six.text_type:
+                x = utilsqh.convertToBinary(x)
+            result.append(x)
+        return result
 
     # when a recognition for this grammar occurs, this function gets called
     # by GramObj (it is set as the callback in GrammarBase.load.
@@ -841,9 +1227,13 @@ class GrammarBase(GramClassBase):
         # - then we make one callback for each different rule found as we
         #   sequentially scan the results (see seqsAndRules example)
         # - finally we call gotResults
-        self.callIfExists( 'gotResultsInit', (words, fullResults) )
-        self.callRuleResultsFunctions(seqsAndRules, fullResults)
-        self.callIfExists( 'gotResults', (words, fullResults) )
+        try:
+            self.callIfExists( 'gotResultsInit', (words, fullResults) )
+            self.callRuleResultsFunctions(seqsAndRules, fullResults)
+            self.callIfExists( 'gotResults', (words, fullResults) )
+        finally:
+            for hook in resultsDoneHooks:
+                hook()
 
     def callRuleResultsFunctions(self, seqsAndRules, fullResults):
         """call the rule functions, can be overloaded (eg in DocstringGrammar)
@@ -867,7 +1257,13 @@ class GrammarBase(GramClassBase):
                 self.nextRule, self.nextWords = Next[1], Next[0]
             
             ruleName, ruleWords = x[1], copy.copy(x[0])    
-            self.callIfExists( 'gotResults_'+ruleName, (ruleWords, fullResults) )
+            if self.handlersDirty: self.buildHandlerTable()
+            try: func = self.ruleHandlers[ruleName]
+            except KeyError:
+                self.callIfExists( 'gotResults_'+ruleName, (ruleWords, fullResults) )
+            else:
+                if func is not None:
+                    self.callHandler(func, (ruleWords, fullResults))
 
 
 #---------------------------------------------------------------------------
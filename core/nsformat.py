@@ -9,9 +9,11 @@ __version__ = "$Revision: 105 $, $Date: 2008-12-04 12:47:13 +0100 (do, 04 dec 20
 #
 # inserted in the unimacro package june 2006
 # adapted for Dragon 11, oct 2011, Quintijn
+# word flags cached per word (getWordsInfo, emptied at vocabulary changes), output collected in a list, oct 2026
 #
 
 import string, types, copy
+import collections
 import natlink
 import natlinkmain
 
@@ -127,43 +129,109 @@ def formatWords(wordList,state=None):
     else:
         gwi = getWordInfo10
 
-    output = ''
-    emptySet = set( () )
+    # collect the words, look up the word info of the other words (through the cache):
+    entries = []
+    lookupWords = []
     for entry in wordList:
         if DNSVersion >= 11 and entry == 'space':
             entry = r'\space-bar\space-bar'
         if type(entry)==type(()):
             assert( len(entry)==2 )
-            wordName = entry[0]
-            wordInfo = entry[1]
+            entries.append(entry)
         else:
             if entry.find('\\letter\\') > 0:
                 entry = entry.lower()  # letters lowercase...
-            wordName = entry
-            wordInfo = gwi(wordName)
+            entries.append( (entry, None) )
+            lookupWords.append(entry)
+    if not entries:
+        return '', state
+    wordInfoDict = getWordsInfo(lookupWords, gwi)
+
+    # init state to a set:
+    emptySet = set( () )
+    if state == 0:
+        state = set([])
+    elif state == -1:
+        #print "no space next at start"
+        state = set([flag_no_space_next])
+    elif state is None:
+        state = set([flag_no_space_next, flag_active_cap_next])
+    elif type(state) in (types.ListType, types.TupleType):
+        state = set(state)
+    elif type(state) != type(emptySet):
+        state = wordInfoToFlags(state)
+        #print 'formatWords starting with: %s'% state
+
+    output = []
+    for wordName, wordInfo in entries:
         if wordInfo is None:
-            wordInfo = set()
-        if type(wordInfo) != type(emptySet):
+            wordInfo = wordInfoDict.get(wordName)
+            if wordInfo is None:
+                wordInfo = emptySet
+        elif type(wordInfo) != type(emptySet):
             wordInfo = wordInfoToFlags(wordInfo)
 
-        # init state to a set:
-        if state == 0:
-            state = set([])
-        elif state == -1:
-            #print "no space next at start"
-            state = set([flag_no_space_next])
-        elif state is None:
-            state = set([flag_no_space_next, flag_active_cap_next])
-        elif type(state) in (types.ListType, types.TupleType):
-            state = set(state)
-        elif type(state) != type(emptySet):
-            state = wordInfoToFlags(state)
-            #print 'formatWords starting with: %s'% state
-
         newText, state = formatWord(wordName,wordInfo,state)
-        output = output + newText
+        output.append(newText)
 
-    return output, state
+    return ''.join(output), state
+
+#---------------------------------------------------------------------------
+# Cache of word flags
+#
+# The word info (as set of flags) is cached per word, so formatting does not
+# ask NatLink again for words that were seen before. The cache is emptied by
+# clearWordInfoCache, which is a natlinkmain vocabularyChangeHook (called at a
+# user switch, at mic on, and after natlinkmain.addWord, setWordInfo and
+# deleteWord), and when natlinkmain.userName changes. Do not change the
+# returned sets.
+
+wordInfoCacheSize = 5000
+wordInfoCache = collections.OrderedDict()
+wordInfoCacheUser = None
+
+def clearWordInfoCache():
+    """empty the word flags cache, call after changes in the vocabulary
+    """
+    global wordInfoCacheUser
+    wordInfoCache.clear()
+    wordInfoCacheUser = getattr(natlinkmain, 'userName', None)
+
+def getWordsInfo(words, gwi=None):
+    """return a dict with the word flags (a set) of each word in words
+    
+    words are looked up in the word flags cache first, the other words are
+    asked through gwi (getWordInfo11 or getWordInfo10), once for each different
+    word (NatLink has no call for the info of several words at once)
+    """
+    if gwi is None:
+        if natlinkmain.DNSVersion >= 11:
+            gwi = getWordInfo11
+        else:
+            gwi = getWordInfo10
+    if getattr(natlinkmain, 'userName', None) != wordInfoCacheUser:
+        clearWordInfoCache()
+    cache = wordInfoCache
+    result = {}
+    for word in words:
+        if word in result:
+            continue
+        key = (gwi, word)
+        try:
+            wordFlags = cache.pop(key)
+        except KeyError:
+            wordFlags = gwi(word)
+            if wordFlags is None:
+                wordFlags = set()
+            elif type(wordFlags) != type(set()):
+                wordFlags = wordInfoToFlags(wordFlags)
+        cache[key] = wordFlags   # (re)insert as most recent
+        result[word] = wordFlags
+    while len(cache) > wordInfoCacheSize:
+        cache.popitem(last=False)
+    return result
+
+natlinkmain.addVocabularyChangeHook(clearWordInfoCache)
 
 countDict= dict(one=1, two=2, three=3, four=4, five=5, six=6, seven=7, eight=8, nine=9,
                 een=1, twee=2, drie=3, vier=4, vijf=5, zes=6, zeven=7, acht=8, negen=9)
@@ -31,6 +31,17 @@ import os.path
 import types
 import copy
 import sys
+import re
+import collections
+import shutil
+import tempfile
+
+reNonAscii = re.compile(b'[\x80-\xff]')
+utf8Bom = b'\xef\xbb\xbf'
+
+# decoded files, {(path, filetype): (mtime, size, result)}, the most recent last:
+readCache = collections.OrderedDict()
+readCacheSize = 50
 
 def fixCrLf(tRaw):
     """replace crlf into lf
@@ -59,47 +70,97 @@ def readAnything(source, filetype=None, tryAlternatives=True):
     sourceslash = source.replace('\\', '/')
     filename = os.path.split(sourceslash)[-1]
     
-    if os.path.isfile(sourceslash):
-        tRaw = io.open(sourceslash, 'rb').read()
-        tRaw = fixCrLf(tRaw)
-
-        if filetype:
-            codingschemes = [filetype]
-        else:
-            codingschemes = ['ascii', 'utf-8', 'cp1252',  'latin-1']
-        # utf16le for nssystem.ini of Dragon15 cannot get this working: 'utf_16le', 'utf_16be', 'utf_16',
-        # chardetResult = chardet.detect(tRaw)
-        # guessedType = chardetResult['encoding']
-        # confidence = chardetResult['confidence']
-        #
-        bom = None
-        for codingscheme in codingschemes:
-            result = DecodeEncode(tRaw, codingscheme)
-            if not result is False:
-                if codingscheme in ('latin-1', 'cp1252'):
-                    pass
-                if result and ord(result[0]) == 65279:  # BOM, remove
-                    result = result[1:]
-                    bom = tRaw[0:3]
-                return codingscheme, bom, result
-        # print 'readAnything: file %s is not ascii, utf-8 or latin-1, continue with chardet'% filename
-        # chardetResult = chardet.detect(tRaw)
-        # guessedType = chardetResult['encoding']
-        # confidence = chardetResult['confidence']
-        # result = DecodeEncode(tRaw, guessedType)
-        print 'readAnything: no valid encoding found for file: %s' % sourceslash
-        return None, None, None
+    try:
+        st = os.stat(sourceslash)
+    except OSError:
+        st = None
+    if st is not None and os.path.isfile(sourceslash):
+        # unchanged files come from the cache:
+        cacheKey = (sourceslash, filetype)
+        cached = readCache.pop(cacheKey, None)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            readCache[cacheKey] = cached
+            return cached[2]
+        result = readAndDecode(sourceslash, filetype)
+        if result[0] is not None:
+            readCache[cacheKey] = (st.st_mtime, st.st_size, result)
+            while len(readCache) > readCacheSize:
+                readCache.popitem(last=False)
+        return result
     else:
         # consider source als stream of text
         # print 'readAnything, continue with text: %s'% makeReadable(source)
         return None, None, source
 
-def writeAnything(filepath, encoding, bom, content):
+def clearReadCache(filepath=None):
+    """forget the decoded contents of filepath, or of all files
+    """
+    if filepath is None:
+        readCache.clear()
+        return
+    sourceslash = filepath.replace('\\', '/')
+    for key in readCache.keys():
+        if key[0] == sourceslash:
+            del readCache[key]
+
+def readAndDecode(sourceslash, filetype=None):
+    """read the file and decode, returns (codingscheme, bom, text) (see readAnything)
+    
+    without filetype the raw bytes are inspected once: a file with only ascii
+    bytes is ascii, with a utf-8 BOM mark or valid utf-8 bytes it is utf-8,
+    otherwise cp1252 or latin-1 (the same result as trying these in a row).
+    """
+    tRaw = io.open(sourceslash, 'rb').read()
+    tRaw = fixCrLf(tRaw)
+    if not filetype:
+        if not reNonAscii.search(tRaw):
+            return 'ascii', None, tRaw.decode('ascii')
+        bom = None
+        try:
+            result = tRaw.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+        else:
+            if tRaw.startswith(utf8Bom):  # BOM, remove
+                result = result[1:]
+                bom = utf8Bom
+            return 'utf-8', bom, result
+        try:
+            return 'cp1252', None, tRaw.decode('cp1252')
+        except UnicodeDecodeError:
+            return 'latin-1', None, tRaw.decode('latin-1')
+
+    codingschemes = [filetype]
+    # utf16le for nssystem.ini of Dragon15 cannot get this working: 'utf_16le', 'utf_16be', 'utf_16',
+    # chardetResult = chardet.detect(tRaw)
+    # guessedType = chardetResult['encoding']
+    # confidence = chardetResult['confidence']
+    #
+    bom = None
+    for codingscheme in codingschemes:
+        result = DecodeEncode(tRaw, codingscheme)
+        if not result is False:
+            if codingscheme in ('latin-1', 'cp1252'):
+                pass
+            if result and ord(result[0]) == 65279:  # BOM, remove
+                result = result[1:]
+                bom = tRaw[0:3]
+            return codingscheme, bom, result
+    # print 'readAnything: file %s is not ascii, utf-8 or latin-1, continue with chardet'% filename
+    # chardetResult = chardet.detect(tRaw)
+    # guessedType = chardetResult['encoding']
+    # confidence = chardetResult['confidence']
+    # result = DecodeEncode(tRaw, guessedType)
+    print 'readAnything: no valid encoding found for file: %s' % sourceslash
+    return None, None, None
+
+def writeAnything(filepath, encoding, bom, content, atomic=False):
     """write unicode or list of unicode to file
     use any of the encodings eg ['ascii', 'utf-8'],
     if they all fail, use xmlcharrefreplace in order to output all
     take "ASCII" if encoding is None
     take "" if bom is None
+    if atomic, write to a temporary file first, and then replace filepath
     """
     if type(content) in (types.ListType, types.TupleType):
         content = '\n'.join(content)
@@ -135,9 +196,42 @@ def writeAnything(filepath, encoding, bom, content):
     if bom:
         print 'add bom for tRaw'
         tRaw = bom + tRaw 
-    nBytes = io.open(filepath, 'wb').write(tRaw)
+    clearReadCache(filepath)
+    if atomic:
+        # a temporary file of its own in the same folder (same drive for the rename),
+        # removed again if writing or replacing fails:
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filepath)),
+                                       prefix=os.path.basename(filepath) + '.', suffix='.tmp')
+        try:
+            f = io.open(fd, 'wb')
+            try:
+                f.write(tRaw)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            if os.path.exists(filepath):
+                shutil.copymode(filepath, tmpPath)  # mkstemp makes it private
+            replaceFile(tmpPath, filepath)
+        except:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+    else:
+        nBytes = io.open(filepath, 'wb').write(tRaw)
     pass
 
+def replaceFile(source, target):
+    """rename source to target, replacing target if it exists
+
+    on Windows os.rename cannot overwrite, so MoveFileEx is used there
+    """
+    if sys.platform == 'win32':
+        import win32api, win32con
+        win32api.MoveFileEx(source, target, win32con.MOVEFILE_REPLACE_EXISTING)
+    else:
+        os.rename(source, target)
+
 def DecodeEncode(tRaw, filetype):
     """return the decoded string or False
     
@@ -16,10 +16,16 @@ import unicodedata
 
 import io
 
-import types, string, os, shutil, copy, filecmp, pywintypes
-import glob, re, sys, traceback
+import types, string, os, shutil, copy, filecmp
+import glob, re, sys, traceback, fnmatch, stat
 import time, filecmp
+try:
+    # pip install scandir (in Python 3.5+ it is os.scandir):
+    from scandir import scandir as _scandir
+except ImportError:
+    _scandir = getattr(os, 'scandir', None)
 if sys.platform != 'linux2':
+    import pywintypes
     import win32com.client
     from win32gui import GetClassName, EnumWindows, GetWindowText, GetWindow
 import urllib, difflib
@@ -511,7 +517,11 @@ def get_best_match(texts, match_against, ignore=' ', treshold=0.9):
     ignore: junk characters (set eg to "_ ")
     treshold: best match must be at least this value.
     
+    texts can also be a BestMatchIndex, which only scores the texts that
+    can reach the treshold.
     """
+    if isinstance(texts, BestMatchIndex):
+        return texts.get_best_match(match_against, ignore=ignore, treshold=treshold)
     # JUNK =  space _
     # now time to figre out the matching
     ratio_calc = difflib.SequenceMatcher(lambda x: x in ignore)
@@ -536,6 +546,132 @@ def get_best_match(texts, match_against, ignore=' ', treshold=0.9):
     if best_ratio > treshold:
         return best_text
 
+class BestMatchIndex(object):
+    """index of texts for get_best_match, texts can be added and removed one by one
+    
+    Each text is kept with its length and bigram counts, and an inverted index
+    from bigram to texts. A lookup only scores (with difflib, like the linear
+    get_best_match) the texts that share enough bigrams with the wanted text
+    to possibly reach the treshold:
+    
+    a text with M matching characters in k blocks shares at least M - k bigrams
+    with the wanted text, and k - 1 <= (la - M) + (lb - M), as the blocks are
+    separated by unmatched characters.
+    
+    So the result is the same as get_best_match with a list of the texts.
+
+    For this reason the texts are indexed and scored as they are, not with the
+    ignore characters removed: difflib's junk characters still count in the
+    lengths of the ratio, and can be matched next to other matches, so
+    removing them changes the ratio ('a b c' and 'abc' give 0.75, 'abc' and
+    'abc' give 1.0), and with it which text is the best match.
+
+>>> index = BestMatchIndex(['Mozilla Firefox', 'Microsoft Word', 'Windows Explorer'])
+>>> index.get_best_match('Microsoft Wrd')
+u'Microsoft Word'
+>>> index.remove('Microsoft Word')
+>>> index.get_best_match('Microsoft Wrd')
+>>> index.add('Microsoft Word - letter.docx')
+>>> index.get_best_match('Microsoft Word - leter.docx', treshold=0.8)
+u'Microsoft Word - letter.docx'
+>>> len(index)
+3
+
+    """
+    def __init__(self, texts=None):
+        self.nextId = 0
+        self.entries = {}     # id: (text, length, bigram counts)
+        self.ids = {}         # text: list of ids
+        self.bigrams = {}     # bigram: {id: count}
+        self.byLength = {}    # length: set of ids
+        for text in texts or []:
+            self.add(text)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for i in sorted(self.entries):
+            yield self.entries[i][0]
+
+    def add(self, text):
+        """add a text (after the texts already present)"""
+        i = self.nextId
+        self.nextId += 1
+        counts = getBigramCounts(text)
+        self.entries[i] = (text, len(text), counts)
+        self.ids.setdefault(text, []).append(i)
+        self.byLength.setdefault(len(text), set()).add(i)
+        for g, n in counts.iteritems():
+            self.bigrams.setdefault(g, {})[i] = n
+
+    def remove(self, text):
+        """remove (the last added occurrence of) text, ValueError if not present"""
+        try:
+            i = self.ids[text].pop()
+        except (KeyError, IndexError):
+            raise ValueError("BestMatchIndex.remove: text not present: %s"% text)
+        if not self.ids[text]:
+            del self.ids[text]
+        text, length, counts = self.entries.pop(i)
+        self.byLength[length].discard(i)
+        for g in counts:
+            postings = self.bigrams[g]
+            del postings[i]
+            if not postings:
+                del self.bigrams[g]
+
+    def getCandidates(self, match_against, treshold):
+        """return the ids of the texts that can have a ratio above treshold, in order"""
+        la = len(match_against)
+        if treshold < 0.7:
+            # the bigram bound only prunes for high tresholds
+            return sorted(self.entries)
+        common = {}
+        for g, na in getBigramCounts(match_against).iteritems():
+            for i, nb in self.bigrams.get(g, {}).iteritems():
+                common[i] = common.get(i, 0) + min(na, nb)
+        candidates = [i for i, n in common.iteritems()
+                      if self._canReach(la, self.entries[i][1], n, treshold)]
+        # texts without common bigrams can only match very short strings:
+        for lb, ids in self.byLength.iteritems():
+            if ids and self._canReach(la, lb, 0, treshold):
+                candidates.extend(i for i in ids if i not in common)
+        candidates.sort()
+        return candidates
+
+    def _canReach(self, la, lb, common, treshold):
+        """can a text of length lb with common bigrams reach a ratio above treshold"""
+        total = la + lb
+        M = int(treshold*total/2)   # conservative lowest number of matching characters
+        if M > min(la, lb):
+            return False
+        return common >= M - (total - 2*M + 1)
+
+    def get_best_match(self, match_against, ignore=' ', treshold=0.9):
+        """as get_best_match, only scoring the candidate texts"""
+        ratio_calc = difflib.SequenceMatcher(lambda x: x in ignore)
+        ratio_calc.set_seq1(match_against)
+        best_ratio = 0
+        best_text = ''
+        for i in self.getCandidates(match_against, treshold):
+            text = self.entries[i][0]
+            ratio_calc.set_seq2(text)
+            ratio = ratio_calc.ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_text = text
+        if best_ratio > treshold:
+            return best_text
+
+def getBigramCounts(text):
+    """return a dict bigram: count of the text"""
+    counts = {}
+    for i in range(len(text) - 1):
+        g = text[i:i+2]
+        counts[g] = counts.get(g, 0) + 1
+    return counts
+
 
 def isSubList(largerList, smallerList):
     """returns 1 if smallerList is a sub list of largerList
@@ -2515,6 +2651,57 @@ def getValidPathUnicode(variablePathDefinition):
 
 class PathError(Exception): pass
 
+class DirEntry(object):
+    """stand in for scandir.DirEntry if the scandir module is not available
+    
+    name, path, is_dir(), is_file(), is_symlink(), stat(): the stat results
+    are taken once, and kept.
+    """
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+        self._stat = self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_symlink(self):
+        try:
+            return stat.S_ISLNK(self.stat(False).st_mode)
+        except OSError:
+            return False
+
+    def __repr__(self):
+        return '<DirEntry %r>'% self.name
+
+def scandir(folder):
+    """yield the DirEntry's of folder, via scandir if available
+    """
+    if _scandir is not None:
+        for entry in _scandir(folder):
+            yield entry
+    else:
+        for name in os.listdir(folder):
+            yield DirEntry(folder, name)
+
 class path(unicode):
     """helper class for path functions
 
@@ -2526,6 +2713,8 @@ class path(unicode):
     p.glob(pattern="*", keepAbs=1, makePath=1)
     p.listdir(makePath=0) (giving all files in folder p)
     p.walk(functionToDo, keepAbs=1, makePath=0)
+    p.scandir(), p.ilistdir(makePath=0), p.iglob(pattern="*", keepAbs=1, makePath=0),
+    p.iwalk(keepAbs=1, makePath=0, entries=0) (generators, with cached stat info)
     p.internetformat, p.unix (for internet filenames)
 
     p.encodePath, p.decodePath: file (dir)  (for gui)
@@ -3163,6 +3352,125 @@ u'C:/temp'
         os.path.walk(unicode(self), functionToDo, arg)
         return self._manipulateList(arg, keepAbs, makePath)
 
+    def scandir(self):
+        """generator of the DirEntry objects of the folder
+        
+        entry.name, entry.is_dir(), entry.is_file() and entry.stat() (for st_mtime,
+        st_size) need no extra system calls on Windows (with the scandir module),
+        and are cached otherwise.
+        """
+        if not self.isdir():
+            raise PathError("scandir only works on folders, not with: %s"% self)
+        return scandir(unicode(self))
+
+    def ilistdir(self, makePath=0):
+        """generator version of listdir, names relative to self
+
+>>> folderName = path(testdrive + '/qhtemp')
+>>> makeEmptyFolder(folderName)
+>>> touch(folderName, 'a.ini', 'b.txt')
+>>> sorted(folderName.ilistdir())
+[u'a.ini', u'b.txt']
+
+        """
+        for entry in self.scandir():
+            if makePath:
+                yield path(entry.name)
+            else:
+                yield entry.name
+
+    def iglob(self, pattern="*", keepAbs=1, makePath=0):
+        """generator version of glob, default unicode items, not path instances
+        
+        patterns with a folder part are passed to glob.iglob
+
+>>> folderName = path(testdrive + '/qhtemp')
+>>> makeEmptyFolder(folderName)
+>>> touch(folderName, 'a.ini', 'b.txt')
+>>> sorted(f.replace(testdrive, 'XXX') for f in folderName.iglob())
+[u'XXX/qhtemp/a.ini', u'XXX/qhtemp/b.txt']
+>>> list(folderName.iglob('*.txt', keepAbs=0))
+[u'b.txt']
+
+        """
+        if not self.isdir():
+            raise PathError("glob must start with folder, not with: %s"% self)
+        if '/' in pattern or '\\' in pattern:
+            L = glob.iglob(unicode(self/pattern))
+            for f in L:
+                for item in self._manipulateList([f], keepAbs, makePath):
+                    yield item
+            return
+        prefix = unicode(self).rstrip('/') + '/'
+        hidden = pattern.startswith('.')
+        for entry in self.scandir():
+            name = entry.name
+            if name.startswith('.') and not hidden:
+                continue
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            if keepAbs:
+                name = prefix + name
+            if makePath:
+                yield path(name)
+            else:
+                yield name
+
+    def iwalk(self, keepAbs=1, makePath=0, entries=0, followlinks=0):
+        """generator version of walk, yields (folder, dirs, files) like os.walk
+        
+        folder: absolute, or relative to self if keepAbs is 0 ('' for self),
+                a path instance if makePath is 1
+        dirs, files: names, or DirEntry objects if entries is 1
+                (with is_dir(), stat() etc from the directory listing)
+        removing items from dirs skips these subfolders (top down).
+        symbolic links to folders are in dirs, but (like os.walk) only walked
+        into if followlinks is 1 (which can loop forever on a link to a parent).
+
+>>> folderName = path(testdrive + '/qhtemp')
+>>> makeEmptyFolder(folderName)
+>>> makeEmptyFolder(folderName/"afolder")
+>>> touch(folderName, 'f.ini')
+>>> touch(folderName/"afolder", 'aa.ini')
+>>> [(d, sorted(dirs), files) for d, dirs, files in folderName.iwalk(keepAbs=0)]
+[(u'', [u'afolder'], [u'f.ini']), (u'afolder', [], [u'aa.ini'])]
+
+        """
+        if not self.isdir():
+            raise PathError("walk must start with folder, not with: %s"% self)
+        top = unicode(self).rstrip('/')
+        stack = [u'']
+        while stack:
+            rel = stack.pop()
+            folder = rel and top + '/' + rel or top
+            try:
+                entryList = list(scandir(folder))
+            except OSError:
+                continue
+            dirs, files, links = [], [], set()
+            for entry in entryList:
+                if entry.is_dir():
+                    dirs.append(entry)
+                    if entry.is_symlink():
+                        links.add(entry.name)
+                else:
+                    files.append(entry)
+            if not entries:
+                dirs = [e.name for e in dirs]
+                files = [e.name for e in files]
+            if keepAbs:
+                result = folder
+            else:
+                result = rel
+            if makePath:
+                result = path(result)
+            yield result, dirs, files
+            names = [getattr(d, 'name', d) for d in dirs]
+            for name in reversed(names):
+                if not followlinks and name in links:
+                    continue
+                stack.append(rel and rel + '/' + name or name)
+
     def _manipulateList(self, List, keepAbs, makePath):
         """helper function for treating a result of listdir or glob
 
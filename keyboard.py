@@ -11,6 +11,8 @@
 # Licensed under LGPL
 
 from natlink import setMicState
+import aenea.recording
+import aenea.tracing
 from aenea import (
     Grammar,
     MappingRule,
@@ -410,3 +412,8 @@ class KeystrokeRule(MappingRule):
     defaults = {
         "n": 1,
     }
+
+    @aenea.tracing.traced_value('KeystrokeRule')
+    def value(self, node):
+        aenea.recording.add_rule('KeystrokeRule', node.words())
+        return MappingRule.value(self, node)
@@ -1,6 +1,8 @@
 # commands for controlling various programs
 
 from aenea import *
+import aenea.recording
+import aenea.tracing
 
 gitcommand_array = [
     'add',
@@ -132,3 +134,8 @@ class ProgramsRule(MappingRule):
     defaults = {
         "n": 1,
     }
+
+    @aenea.tracing.traced_value('ProgramsRule')
+    def value(self, node):
+        aenea.recording.add_rule('ProgramsRule', node.words())
+        return MappingRule.value(self, node)
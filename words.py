@@ -13,6 +13,8 @@ import aenea.misc
 import aenea.vocabulary
 import aenea.configuration
 import aenea.format
+import aenea.recording
+import aenea.tracing
 
 from aenea import (
     AeneaContext,
@@ -45,6 +47,7 @@ class NopeFormatRule(CompoundRule):
     spec = ('undo that')
 
     def value(self, node):
+        aenea.recording.add_rule('NopeFormatRule', node.words())
         global lastFormatRuleLength
         print "erasing previous format of length", lastFormatRuleLength
         return Key('backspace:' + str(lastFormatRuleLength))
@@ -87,7 +90,9 @@ class FormatRule(CompoundRule):
     spec = ('( camel | macro | sentence | [uppercase] jumble | [uppercase] natword ) <dictation> [bomb]')
     extras = [Dictation(name='dictation')]
 
+    @aenea.tracing.traced_value('FormatRule')
     def value(self, node):
+        aenea.recording.add_rule('FormatRule', node.words())
         words = node.words()
         print "format rule:", words
 